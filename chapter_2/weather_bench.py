@@ -0,0 +1,366 @@
+"""Load generator and latency benchmarks for weather observer fan-out.
+
+``python weather_bench.py scaling --json results.json`` measures notify latency,
+throughput and per-observer cost for 1 to 100k observers, for the push and
+pull modules. ``--subject`` swaps in another Subject: ``threaded``, ``async``
+or any ``module:Class``. Subjects with a coroutine join() are driven under an
+event loop. Add ``--baseline old.json`` to exit non-zero when any figure
+is more than ``--threshold`` worse than the baseline.
+
+``python weather_bench.py load --observers 1000 --rate 500`` drives one station
+at a fixed reading rate and prints its latency histogram.
+"""
+import argparse
+import asyncio
+import importlib
+import inspect
+import json
+import math
+import random
+import sys
+import time
+
+import weather_station_pull
+import weather_station_push
+from weather_station_async import AsyncSubject
+from weather_station_threaded import ExecutorSubject
+
+VARIANTS = {"push": weather_station_push, "pull": weather_station_pull}
+SUBJECTS = {"threaded": ExecutorSubject, "async": AsyncSubject}
+OBSERVER_COUNTS = (1, 10, 100, 1_000, 10_000, 100_000)
+
+
+class PushCounter(weather_station_push.Display):
+    """Counts its updates instead of printing them, so dispatch dominates."""
+
+    def __init__(self, weather_data) -> None:
+        self.updates = 0
+        super().__init__(weather_data)
+
+    def display(self):
+        self.updates += 1
+
+
+class PullCounter(weather_station_pull.Display):
+    """Pulls a snapshot and counts its updates instead of printing them."""
+
+    def __init__(self, weather_data) -> None:
+        self.updates = 0
+        super().__init__(weather_data)
+
+    def update(self):
+        snapshot = self.weather_data.get_snapshot()
+        self.temp, self.humidity, self.pressure = snapshot[1:]
+        self.updates += 1
+
+
+COUNTERS = {"push": PushCounter, "pull": PullCounter}
+
+
+def subject_class(name, variant):
+    """Find a Subject class by name: "default", a SUBJECTS key or "module:Class"."""
+    if name == "default":
+        return VARIANTS[variant].Subject
+    if name in SUBJECTS:
+        return SUBJECTS[name]
+    module, _, attribute = name.partition(":")
+    return getattr(importlib.import_module(module), attribute)
+
+
+def needs_loop(subject_type):
+    """Whether a Subject delivers from asyncio tasks, so must run in a loop."""
+    return inspect.iscoroutinefunction(getattr(subject_type, "join", None))
+
+
+def build_station(variant, observers, subject="default", sample_every=None):
+    """Return a WeatherData with `observers` counting displays, and the displays.
+
+    Observers are held weakly, so keep the displays for as long as the
+    WeatherData is driven. With `sample_every`, the subject is instrumented.
+    """
+    subject_type = subject_class(subject, variant)
+    if sample_every and not hasattr(subject_type, "instrument"):
+        raise ValueError(f"{subject_type.__name__} can't be instrumented.")
+    weather_data = VARIANTS[variant].WeatherData(subject_type())
+    if sample_every:
+        weather_data.subject.instrument(sample_every=sample_every)
+    displays = [COUNTERS[variant](weather_data) for _ in range(observers)]
+    return weather_data, displays
+
+
+def random_readings(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        (rng.uniform(-10, 40), rng.uniform(0, 100), rng.uniform(980, 1040))
+        for _ in range(count)
+    ]
+
+
+def drive(weather_data, readings, rate=None):
+    """Feed `readings` to `weather_data`, `rate` per second if given.
+
+    Returns (latencies, elapsed) in seconds. A latency runs from
+    set_measurements() until every observer has the reading. For subjects
+    that deliver in the background, that includes waiting on their join().
+    """
+    join = getattr(weather_data.subject, "join", None)
+    if needs_loop(type(weather_data.subject)):
+        raise ValueError("Subjects that need an event loop go through drive_async().")
+    latencies = []
+    start = time.perf_counter()
+    for index, reading in enumerate(readings):
+        if rate:
+            delay = start + index / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        sent = time.perf_counter()
+        weather_data.set_measurements(*reading)
+        if join is not None:
+            join()
+        latencies.append(time.perf_counter() - sent)
+    return latencies, time.perf_counter() - start
+
+
+async def drive_async(weather_data, readings, rate=None):
+    """drive() for a subject whose join() is a coroutine, from inside its loop.
+
+    Waits are awaited, so the subject's tasks deliver while the driver waits.
+    """
+    join = weather_data.subject.join
+    latencies = []
+    start = time.perf_counter()
+    for index, reading in enumerate(readings):
+        if rate:
+            delay = start + index / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        sent = time.perf_counter()
+        weather_data.set_measurements(*reading)
+        await join()
+        latencies.append(time.perf_counter() - sent)
+    return latencies, time.perf_counter() - start
+
+
+# percentile(), flatten() and regressions() are this chapter's only copies.
+# Each chapter runs as its own directory of scripts with no shared import
+# path, so chapter_3 keeps its own in starbuzz_server and starbuzz_bench.
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of an unsorted sequence."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def histogram(latencies):
+    """Count latencies into power-of-two microsecond buckets, keyed by upper bound."""
+    buckets = {}
+    for latency in latencies:
+        bound = 2 ** max(0, math.ceil(math.log2(max(latency * 1e6, 1))))
+        buckets[bound] = buckets.get(bound, 0) + 1
+    return dict(sorted(buckets.items()))
+
+
+def summarize(latencies, elapsed, observers):
+    return {
+        "p50_s": percentile(latencies, 0.50),
+        "p90_s": percentile(latencies, 0.90),
+        "p99_s": percentile(latencies, 0.99),
+        "max_s": max(latencies),
+        "readings_per_s": len(latencies) / elapsed,
+        "per_observer_s": sum(latencies) / len(latencies) / observers,
+        "histogram_us": histogram(latencies),
+    }
+
+
+def bench_station(
+    variant, observers, readings, subject="default", rate=None, sample_every=None
+):
+    if needs_loop(subject_class(subject, variant)):
+        return asyncio.run(
+            bench_station_async(
+                variant, observers, readings, subject, rate, sample_every
+            )
+        )
+    weather_data, displays = build_station(variant, observers, subject, sample_every)
+    try:
+        latencies, elapsed = drive(weather_data, random_readings(readings), rate)
+    finally:
+        shutdown = getattr(weather_data.subject, "shutdown", None)
+        if shutdown is not None:
+            shutdown()
+    check_updates(displays, readings, f"{variant} subject {subject!r}")
+    return summarize(latencies, elapsed, observers)
+
+
+async def bench_station_async(
+    variant, observers, readings, subject, rate=None, sample_every=None
+):
+    """bench_station() for subjects that need an event loop, run inside one."""
+    weather_data, displays = build_station(variant, observers, subject, sample_every)
+    try:
+        latencies, elapsed = await drive_async(
+            weather_data, random_readings(readings), rate
+        )
+    finally:
+        await weather_data.subject.close()
+    check_updates(displays, readings, f"{variant} subject {subject!r}")
+    return summarize(latencies, elapsed, observers)
+
+
+def check_updates(displays, readings, name):
+    if sum(display.updates for display in displays) != len(displays) * readings:
+        raise RuntimeError(f"{name} lost updates.")
+
+
+def bench_scaling(
+    variants=("push", "pull"),
+    subject="default",
+    counts=OBSERVER_COUNTS,
+    budget=2_000_000,
+    sample_every=None,
+):
+    """Scaling curve per variant; each point makes about `budget` updates."""
+    return {
+        variant: {
+            count: bench_station(
+                variant,
+                count,
+                max(20, min(2_000, budget // count)),
+                subject,
+                sample_every=sample_every,
+            )
+            for count in counts
+        }
+        for variant in variants
+    }
+
+
+def flatten(results, prefix=""):
+    """Flatten nested results into {"variant.observers.metric": value}."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def regressions(results, baseline, threshold):
+    """Figures more than `threshold` worse than the baseline.
+
+    Throughput (``_per_s``) regresses when it drops and times when they
+    grow. Histogram counts are left out.
+    """
+    current = flatten(results)
+    worse = []
+    for name, old in flatten(baseline).items():
+        new = current.get(name)
+        if new is None or not old or ".histogram_us." in name:
+            continue
+        higher_is_better = "_per_s" in name
+        change = (old - new) / old if higher_is_better else (new - old) / old
+        if change > threshold:
+            worse.append((name, old, new, change))
+    return worse
+
+
+def run_scaling(args):
+    counts = [count for count in OBSERVER_COUNTS if count <= args.max_observers]
+    results = bench_scaling(
+        args.variants, args.subject, counts, sample_every=args.instrument
+    )
+    print("variant observers      p50      p99   readings/s  per observer")
+    for variant, curve in results.items():
+        for count, result in curve.items():
+            print(
+                f"{variant:>7} {count:>9} "
+                f"{result['p50_s'] * 1e6:>7.1f}us {result['p99_s'] * 1e6:>7.1f}us "
+                f"{result['readings_per_s']:>12,.0f} "
+                f"{result['per_observer_s'] * 1e9:>10.0f}ns"
+            )
+    # JSON keys are strings, so round-trip before comparing with a baseline.
+    results = json.loads(json.dumps(results))
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        worse = regressions(results, baseline, args.threshold)
+        for name, old, new, change in worse:
+            print(f"REGRESSION {name}: {old:.4g} -> {new:.4g} ({change:+.0%})")
+        return 1 if worse else 0
+    return 0
+
+
+def run_load(args):
+    for variant in args.variants:
+        result = bench_station(
+            variant,
+            args.observers,
+            args.readings,
+            args.subject,
+            args.rate,
+            args.instrument,
+        )
+        print(
+            f"{variant}: {result['readings_per_s']:,.0f} readings/s, "
+            f"p50 {result['p50_s'] * 1e6:.1f}us, p99 {result['p99_s'] * 1e6:.1f}us, "
+            f"max {result['max_s'] * 1e6:.1f}us"
+        )
+        peak = max(result["histogram_us"].values())
+        for bound, count in result["histogram_us"].items():
+            bar = "#" * max(1, round(40 * count / peak))
+            print(f"  <={bound:>8}us {count:>7} {bar}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("bench", choices=["scaling", "load"])
+    parser.add_argument(
+        "--variant",
+        dest="variants",
+        action="append",
+        choices=list(VARIANTS),
+        help="push or pull; repeat for both (the default)",
+    )
+    parser.add_argument(
+        "--subject",
+        default="default",
+        help='"default", "threaded", "async" or a module:Class to build it from',
+    )
+    parser.add_argument("--max-observers", type=int, default=OBSERVER_COUNTS[-1])
+    parser.add_argument("--observers", type=int, default=100)
+    parser.add_argument("--readings", type=int, default=2_000)
+    parser.add_argument("--rate", type=float, help="readings per second to drive")
+    parser.add_argument(
+        "--instrument",
+        type=int,
+        metavar="N",
+        help="time observer updates, sampling one call in N",
+    )
+    parser.add_argument("--json", help="write scaling results to this file")
+    parser.add_argument("--baseline", help="scaling results to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="allowed slowdown against the baseline, as a fraction",
+    )
+    args = parser.parse_args()
+    args.variants = args.variants or list(VARIANTS)
+    if args.instrument:
+        for variant in args.variants:
+            subject_type = subject_class(args.subject, variant)
+            if not hasattr(subject_type, "instrument"):
+                parser.error(
+                    f"--instrument needs a Subject with instrument(), "
+                    f"which {subject_type.__name__} doesn't have"
+                )
+    sys.exit(run_scaling(args) if args.bench == "scaling" else run_load(args))
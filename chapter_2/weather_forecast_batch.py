@@ -0,0 +1,62 @@
+"""Vectorized pressure forecasts for many stations at once.
+
+Each station's ForecastEngine keeps its history in typed arrays. Joining
+their raw buffers gives a (stations, capacity) matrix, from which
+every station's least-squares slope comes out of a few array operations.
+"""
+import numpy as np
+
+from weather_history import FORECASTS
+
+TRENDS = ("falling", "steady", "rising")
+
+
+def stack_histories(engines):
+    """Return (times, pressures, valid) matrices, one row per engine."""
+    capacities = {engine.history.capacity for engine in engines}
+    if len(capacities) > 1:
+        raise ValueError("All histories must have the same capacity.")
+    times, pressures = (
+        np.frombuffer(b"".join([e.history.columns[name] for e in engines]))
+        .reshape(len(engines), -1)
+        for name in ("timestamp", "pressure")
+    )
+    counts = np.array([len(engine.history) for engine in engines])
+    # A ring fills from slot 0, so its first `count` slots are the readings.
+    valid = np.arange(times.shape[1]) < counts[:, None]
+    return times, pressures, valid
+
+
+def pressure_slopes(engines):
+    """Least-squares pressure slope per second for each engine, NaN if unknown.
+
+    A slope doesn't depend on reading order, so the rings are used as they
+    are, without unrolling.
+    """
+    times, pressures, valid = stack_histories(engines)
+    n = valid.sum(axis=1)
+    # Center each row on its first slot to keep the sums well conditioned.
+    t = np.where(valid, times - times[:, :1], 0.0)
+    p = np.where(valid, pressures - pressures[:, :1], 0.0)
+    st, sp = t.sum(axis=1), p.sum(axis=1)
+    denominator = n * (t * t).sum(axis=1) - st * st
+    numerator = n * (t * p).sum(axis=1) - st * sp
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where((n >= 2) & (denominator > 0), numerator / denominator, np.nan)
+
+
+def forecast_stations(engines, steady=0.5):
+    """Return (slopes per hour, EWMAs, trends, forecasts) for every engine.
+
+    Trends are "rising", "steady" or "falling", as ForecastEngine.trend
+    gives them; an unknown slope counts as steady.
+    """
+    per_hour = pressure_slopes(engines) * 3600
+    codes = np.ones(len(per_hour), dtype=np.int64)
+    codes[per_hour > steady] = 2
+    codes[per_hour < -steady] = 0
+    ewmas = np.array(
+        [np.nan if e.ewma is None else e.ewma for e in engines], dtype=np.float64
+    )
+    trends = [TRENDS[code] for code in codes]
+    return per_hour, ewmas, trends, [FORECASTS[trend] for trend in trends]
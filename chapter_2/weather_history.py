@@ -0,0 +1,133 @@
+"""Fixed-size measurement history and an incremental pressure forecast."""
+import array
+
+from weather_subscriptions import FIELDS
+
+COLUMNS = ("timestamp",) + FIELDS
+FORECASTS = {
+    "rising": "Improving weather on the way!",
+    "steady": "More of the same",
+    "falling": "Watch out for cooler, rainy weather",
+}
+
+
+class History:
+    """The last `capacity` (timestamp, temp, humidity, pressure) readings.
+
+    Each column is a preallocated array of doubles used as a ring, so
+    appending never allocates. While the ring is filling, the readings sit
+    in slots 0..count-1; after that, `start` is the slot of the oldest.
+    """
+
+    def __init__(self, capacity=256) -> None:
+        self.capacity = capacity
+        self.columns = {
+            name: array.array("d", bytes(8 * capacity)) for name in COLUMNS
+        }
+        self.start = 0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, timestamp, temp, humidity, pressure):
+        """Store a reading; return the one it overwrote, or None."""
+        reading = (timestamp, temp, humidity, pressure)
+        if self.count < self.capacity:
+            slot, evicted = self.count, None
+            self.count += 1
+        else:
+            slot = self.start
+            evicted = tuple(self.columns[name][slot] for name in COLUMNS)
+            self.start = (slot + 1) % self.capacity
+        for name, value in zip(COLUMNS, reading):
+            self.columns[name][slot] = value
+        return evicted
+
+    def column(self, name):
+        """Return a column oldest first."""
+        values = self.columns[name]
+        if self.count < self.capacity:
+            return values[: self.count]
+        return values[self.start :] + values[: self.start]
+
+
+class ForecastEngine:
+    """Pressure EWMA and trend over a History, updated in O(1) per reading.
+
+    The trend is the least-squares slope of pressure against time over the
+    readings in the history. Its sums are updated as readings enter and
+    leave the ring. To keep them accurate, times and pressures are taken
+    relative to the oldest reading, and the sums are rebuilt from the ring
+    once per `capacity` readings. A slope within `steady` hPa per hour counts as steady.
+    """
+
+    def __init__(self, capacity=256, alpha=0.3, steady=0.5) -> None:
+        self.history = History(capacity)
+        self.alpha = alpha
+        self.steady = steady
+        self.ewma = None
+        self._since_rebase = 0
+        self._rebase()
+
+    def add(self, timestamp, temp, humidity, pressure):
+        evicted = self.history.append(timestamp, temp, humidity, pressure)
+        if self.ewma is None:
+            self.ewma = float(pressure)
+        else:
+            self.ewma += self.alpha * (pressure - self.ewma)
+        self._since_rebase += 1
+        if self._since_rebase >= self.history.capacity:
+            self._rebase()
+            return
+        if evicted is not None:
+            self._account(evicted[0], evicted[3], -1)
+        elif len(self.history) == 1:
+            self._origin = (timestamp, pressure)
+        self._account(timestamp, pressure, 1)
+
+    @property
+    def slope(self):
+        """Pressure change per second, or None until there are two times."""
+        n, t, p, tt, tp = self._sums
+        denominator = n * tt - t * t
+        if n < 2 or denominator <= 0:
+            return None
+        return (n * tp - t * p) / denominator
+
+    @property
+    def trend(self):
+        slope = self.slope
+        if slope is None:
+            return "steady"
+        per_hour = slope * 3600
+        if per_hour > self.steady:
+            return "rising"
+        if per_hour < -self.steady:
+            return "falling"
+        return "steady"
+
+    def forecast(self):
+        return FORECASTS[self.trend]
+
+    def _account(self, timestamp, pressure, sign):
+        t = timestamp - self._origin[0]
+        pressure -= self._origin[1]
+        n, st, sp, stt, stp = self._sums
+        self._sums = (
+            n + sign,
+            st + sign * t,
+            sp + sign * pressure,
+            stt + sign * t * t,
+            stp + sign * t * pressure,
+        )
+
+    def _rebase(self):
+        history = self.history
+        times = history.column("timestamp")
+        pressures = history.column("pressure")
+        self._origin = (times[0], pressures[0]) if times else (0.0, 0.0)
+        self._sums = (0, 0.0, 0.0, 0.0, 0.0)
+        for timestamp, pressure in zip(times, pressures):
+            self._account(timestamp, pressure, 1)
+        self._since_rebase = 0
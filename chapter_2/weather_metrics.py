@@ -0,0 +1,170 @@
+"""Per-observer timings, call counts and errors for weather subjects."""
+import sys
+import threading
+import time
+import weakref
+
+from weather_statistics import P2Quantile, RunningStats
+
+
+class ObserverStats:
+    """What one observer's sampled updates have cost so far."""
+
+    def __init__(self, name, ref) -> None:
+        self.name = name
+        self.ref = ref
+        self.errors = 0
+        self.last_error = None
+        self.durations = RunningStats()
+        self.p99 = P2Quantile(0.99)
+        self.slow = False
+
+    def as_dict(self, sample_every):
+        durations = self.durations
+        return {
+            "name": self.name,
+            "sampled_calls": durations.count,
+            "estimated_calls": durations.count * sample_every,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "mean_s": durations.mean,
+            "p99_s": self.p99.value,
+            "max_s": durations.max,
+            "slow": self.slow,
+        }
+
+
+class ObserverMetrics:
+    """Times observer updates for a Subject and flags the slow ones.
+
+    The subject asks sample() once per notification, and times every update
+    in one notification out of `sample_every`; the others run as if there
+    were no metrics. Errors are counted in every notification. Once an
+    observer has `min_samples` timings and its estimated p99 goes over
+    `budget` seconds, it is flagged as slow and passed to `on_slow`.
+
+    Stats are keyed by id() for a cheap lookup. Each entry holds a weak
+    reference whose callback drops the entry, so an id is never reused
+    while its entry is still there.
+    """
+
+    def __init__(
+        self,
+        sample_every=16,
+        budget=None,
+        on_slow=None,
+        min_samples=20,
+        clock=time.perf_counter,
+    ) -> None:
+        self.sample_every = sample_every
+        self.budget = budget
+        self.on_slow = on_slow
+        self.min_samples = min_samples
+        self.clock = clock
+        self.notifications = 0
+        self.stats = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        """Count a notification; return True if its updates should be timed."""
+        self.notifications += 1
+        return not self.notifications % self.sample_every
+
+    def call(self, observer, update, *args):
+        """Run `update(*args)` on behalf of `observer` and time it."""
+        stats = self._stats(observer)
+        start = self.clock()
+        try:
+            update(*args)
+        except Exception as error:
+            self.failed(observer, error)
+            raise
+        finally:
+            self._record(observer, stats, self.clock() - start)
+
+    def failed(self, observer, error):
+        stats = self._stats(observer)
+        stats.errors += 1
+        # Keep only the text: the traceback would keep the observer alive.
+        stats.last_error = repr(error)
+
+    def _stats(self, observer):
+        key = id(observer)
+        stats = self.stats.get(key)
+        if stats is None:
+            ref = weakref.ref(observer, lambda _: self.stats.pop(key, None))
+            name = f"{type(observer).__name__}@{key:x}"
+            stats = self.stats[key] = ObserverStats(name, ref)
+        return stats
+
+    def _record(self, observer, stats, duration):
+        stats.durations.add(duration)
+        stats.p99.add(duration)
+        if self.budget is None or stats.durations.count < self.min_samples:
+            return
+        was_slow = stats.slow
+        stats.slow = stats.p99.value > self.budget
+        if stats.slow and not was_slow and self.on_slow is not None:
+            self.on_slow(observer)
+
+    def reset(self, observer):
+        """Forget an observer's figures, e.g. after it was released."""
+        stats = self.stats.pop(id(observer), None)
+        if stats is not None:
+            self._stats(observer)
+
+    def slow_observers(self):
+        return [
+            observer
+            for observer in (s.ref() for s in list(self.stats.values()) if s.slow)
+            if observer is not None
+        ]
+
+    def snapshot(self):
+        """Return {observer: figures} for every live observer seen so far."""
+        figures = {}
+        for stats in list(self.stats.values()):
+            observer = stats.ref()
+            if observer is not None:
+                figures[observer] = stats.as_dict(self.sample_every)
+        return figures
+
+    def report(self):
+        """Return the figures as text, one line per observer, slowest first."""
+        rows = sorted(
+            self.snapshot().items(),
+            key=lambda item: item[1]["p99_s"] or 0.0,
+            reverse=True,
+        )
+        lines = []
+        for _, figures in rows:
+            flag = " SLOW" if figures["slow"] else ""
+            p99 = figures["p99_s"]
+            mean = figures["mean_s"]
+            lines.append(
+                f"{figures['name']}: ~{figures['estimated_calls']} calls, "
+                f"{figures['errors']} errors, "
+                f"mean {0 if mean is None else mean * 1e6:.1f}us, "
+                f"p99 {0 if p99 is None else p99 * 1e6:.1f}us{flag}"
+            )
+        return "\n".join(lines)
+
+    def dump_every(self, interval=10.0, file=None):
+        """Write report() to `file` (stderr by default) from a daemon thread."""
+        self.stop()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._dump, args=(interval, file), daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _dump(self, interval, file):
+        while not self._stop.wait(interval):
+            print(self.report(), file=file or sys.stderr, flush=True)
@@ -0,0 +1,177 @@
+"""Observer pattern: weather station with asyncio dispatch.
+
+set_measurements() only appends the reading to an ingest queue, so it returns
+in constant time however many observers are registered. A dispatcher task fans
+readings out to a bounded queue per observer, each drained by the observer's
+own consumer task, so a slow display only ever holds up itself.
+"""
+import asyncio
+import collections
+import enum
+import inspect
+import time
+
+from weather_station_push import (
+    CurrentConditionsDisplay,
+    Display,
+    StatisticsDisplay,
+    WeatherData,
+)
+
+
+class Overflow(str, enum.Enum):
+    block = "BLOCK"
+    drop_oldest = "DROP_OLDEST"
+    conflate = "CONFLATE"
+
+
+class Mailbox:
+    """One observer's bounded queue and the task that feeds its updates.
+
+    When the queue is full, `block` makes the dispatcher wait for room,
+    `drop_oldest` discards the oldest queued reading and `conflate` keeps only
+    the latest reading.
+    """
+
+    def __init__(self, observer, maxsize, overflow: Overflow) -> None:
+        self.observer = observer
+        self.overflow = overflow
+        maxsize = 1 if overflow == Overflow.conflate else maxsize
+        self.queue = asyncio.Queue(maxsize)
+        self.delivered = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+        self.closed = False
+        self.task = asyncio.get_running_loop().create_task(self.consume())
+
+    async def put(self, args):
+        if self.closed:
+            return
+        if self.overflow == Overflow.block:
+            await self.queue.put(args)
+            return
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.dropped += 1
+        self.queue.put_nowait(args)
+
+    async def consume(self):
+        while True:
+            args = await self.queue.get()
+            try:
+                result = self.observer.update(*args)
+                if inspect.isawaitable(result):
+                    await result
+                self.delivered += 1
+            except Exception as error:
+                self.errors += 1
+                self.last_error = error
+            finally:
+                self.queue.task_done()
+
+    def close(self):
+        """Stop the consumer and drop whatever is still queued.
+
+        Emptying the queue also frees a dispatcher blocked in put().
+        """
+        self.closed = True
+        self.task.cancel()
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.queue.task_done()
+
+
+class AsyncSubject:
+    def __init__(self, maxsize=64, overflow=Overflow.drop_oldest) -> None:
+        self.maxsize = maxsize
+        self.overflow = Overflow(overflow)
+        self.observers = {}
+        self._pending = collections.deque()
+        self._ready = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._dispatcher = None
+
+    def register_observer(self, observer, maxsize=None, overflow=None):
+        """Register, or re-register with a new queue size or overflow policy."""
+        self.remove_observer(observer)
+        self.observers[observer] = Mailbox(
+            observer,
+            maxsize or self.maxsize,
+            Overflow(overflow or self.overflow),
+        )
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.get_running_loop().create_task(
+                self._dispatch()
+            )
+
+    def remove_observer(self, observer):
+        mailbox = self.observers.pop(observer, None)
+        if mailbox is not None:
+            mailbox.close()
+
+    def notify_observers(self, *args):
+        self._pending.append(args)
+        self._idle.clear()
+        self._ready.set()
+
+    async def _dispatch(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self._pending:
+                args = self._pending.popleft()
+                for mailbox in list(self.observers.values()):
+                    # Skip mailboxes removed while an earlier put() waited.
+                    if not mailbox.closed:
+                        await mailbox.put(args)
+            self._idle.set()
+
+    async def join(self):
+        """Wait until every reading so far has reached every observer."""
+        await self._idle.wait()
+        await asyncio.gather(*(m.queue.join() for m in self.observers.values()))
+
+    def stats(self):
+        """Return {observer: (delivered, dropped, errors)}."""
+        return {
+            observer: (mailbox.delivered, mailbox.dropped, mailbox.errors)
+            for observer, mailbox in self.observers.items()
+        }
+
+    async def close(self):
+        for observer in list(self.observers):
+            self.remove_observer(observer)
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+
+class SlowDisplay(Display):
+    async def update(self, temp, humidity, pressure):
+        await asyncio.sleep(0.01)
+        super().update(temp, humidity, pressure)
+
+    def display(self):
+        print(f"Slow display... temp: {self.temp}")
+
+
+async def main():
+    weather_data = WeatherData(AsyncSubject(maxsize=4))
+    CurrentConditionsDisplay(weather_data)
+    StatisticsDisplay(weather_data)
+    slow_display = SlowDisplay(weather_data)
+    weather_data.subject.register_observer(slow_display, overflow=Overflow.conflate)
+    start = time.perf_counter()
+    for reading in range(10):
+        weather_data.set_measurements(70 + reading, 30, 10)
+    elapsed = time.perf_counter() - start
+    await weather_data.subject.join()
+    print(f"10 readings ingested in {elapsed * 1e6:.0f}us")
+    await weather_data.subject.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
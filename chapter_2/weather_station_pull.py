@@ -1,61 +1,227 @@
 """Observer pattern: Weather station app."""
+import collections
+import itertools
+import threading
+import time
 
+from weather_history import ForecastEngine
+from weather_statistics import P2Quantile, RunningStats, SlidingWindow
+from weather_subscriptions import SubjectBase, in_order
 
-class Subject:
-    def __init__(self) -> None:
-        self.observers = set()
-
-    def register_observer(self, observer):
-        self.observers.add(observer)
-
-    def remove_observer(self, observer):
-        self.observers.discard(observer)
 
+class Subject(SubjectBase):
     def notify_observer(self, observer):
-        observer.update()
+        limit = self.limits.get(observer)
+        if limit is None:
+            # The common case, kept inline: it runs per observer per reading.
+            if self._timed:
+                self.metrics.call(observer, observer.update)
+            else:
+                observer.update()
+            return
+        # A pull observer reads the current state, so one empty reading
+        # stands for the latest measurements.
+        for _ in limit.offer(()):
+            if self._timed:
+                self.metrics.call(observer, observer.update)
+            else:
+                observer.update()
 
     def notify_observers(self):
-        for observer in self.observers:
-            self.notify_observer(observer)
+        """Notify everyone; without the reading, changes can't be detected."""
+        self._notify(self.observers, None)
+
+    def notify_woken(self, woken):
+        """Notify the observers and the subscribers a reading woke.
+
+        `woken` comes from subscriptions.wake(), which the publisher calls
+        while it holds its write lock.
+        """
+        self._notify(self.observers, woken)
+
+    def _notify(self, observers, woken):
+        """Notify an ObserverRegistry and the `woken` subscribers, or all.
+
+        Everyone is notified in registration order. With metrics, one
+        notification in a sample is timed, and an error is recorded against
+        the observer that raised it.
+        """
+        if woken is None:
+            woken = self.subscriptions.ordered()
+        if woken:
+            observers = in_order(observers.ordered(), woken)
+        metrics = self.metrics
+        if metrics is None:
+            for observer in observers:
+                self.notify_observer(observer)
+            return
+        self._timed = metrics.sample()
+        observer = None
+        try:
+            for observer in observers:
+                self.notify_observer(observer)
+        except Exception as error:
+            if not self._timed:
+                metrics.failed(observer, error)
+            raise
+        finally:
+            self._timed = False
+
+    def notify_observers_batch(self, readings):
+        """Call update_batch() once on the observers that have it.
+
+        Other observers are notified once per step of `readings`, a
+        BatchReplay that publishes the batch one reading at a time, and
+        subscribers only at the steps that change what they subscribed to.
+        update_batch() runs once the whole batch is published.
+        """
+        batch = [
+            observer
+            for observer in self.observers
+            if hasattr(observer, "update_batch") and observer not in self.limits
+        ]
+        legacy = self.observers.without(batch)
+        if legacy or self.subscriptions:
+            for woken in readings:
+                self._notify(legacy, woken)
+        batch_args = readings.finish()
+        for observer in batch:
+            self._deliver(observer, observer.update_batch, *batch_args)
+
+
+Snapshot = collections.namedtuple("Snapshot", "version temp humidity pressure")
+
+
+class BatchReplay:
+    """Publishes a batch of readings one at a time as it is iterated.
+
+    Each step publishes the next reading and yields the subscribers its
+    changes wake. finish() publishes the rest in one go and returns the
+    (snapshot, temps, humidities, pressures) arguments of update_batch().
+    """
+
+    def __init__(self, weather_data, temps, humidities, pressures) -> None:
+        self.weather_data = weather_data
+        self.columns = (temps, humidities, pressures)
+        self.published = 0
+        self.snapshot = None
+
+    def __iter__(self):
+        publish = self.weather_data._publish
+        for reading in itertools.islice(zip(*self.columns), self.published, None):
+            self.published += 1
+            self.snapshot, woken = publish(*reading)
+            yield woken
+
+    def finish(self):
+        rest = len(self.columns[0]) - self.published
+        if rest:
+            # Publish only the last reading, numbered as if every reading had
+            # been published.
+            last = (column[-1] for column in self.columns)
+            self.snapshot, _ = self.weather_data._publish(*last, step=rest)
+            self.published += rest
+        return (self.snapshot, *self.columns)
 
 
 class WeatherData:
-    def __init__(self) -> None:
-        self.temp = None
-        self.humidity = None
-        self.pressure = None
-        self.subject = Subject()
+    """Publishes each reading as an immutable, versioned Snapshot.
+
+    Publishing rebinds one attribute, so a reader who takes get_snapshot()
+    sees a whole reading without locking, however many threads are writing.
+    Writers take a lock only to number their snapshots and to find the
+    subscribers each one wakes; observers are notified outside it. Versions
+    count readings, so an observer can skip a snapshot whose version it has
+    already handled.
+    """
+
+    def __init__(self, subject=None) -> None:
+        self.snapshot = Snapshot(0, None, None, None)
+        self.subject = Subject() if subject is None else subject
+        self._write_lock = threading.Lock()
+        self._wake = None
+        if hasattr(self.subject, "notify_woken"):
+            self._wake = self.subject.subscriptions.wake
+
+    @property
+    def temp(self):
+        return self.snapshot.temp
+
+    @property
+    def humidity(self):
+        return self.snapshot.humidity
+
+    @property
+    def pressure(self):
+        return self.snapshot.pressure
+
+    def get_snapshot(self):
+        return self.snapshot
 
     def get_temp(self):
-        return self.temp
+        return self.snapshot.temp
 
     def get_humidity(self):
-        return self.humidity
+        return self.snapshot.humidity
 
     def get_pressure(self):
-        return self.pressure
+        return self.snapshot.pressure
 
     def set_measurements(self, temp, humidity, pressure):
-        self.temp = temp
-        self.humidity = humidity
-        self.pressure = pressure
-        self.measurements_changed()
-
-    def register_observer(self, observer):
-        self.subject.register_observer(observer)
+        _, woken = self._publish(temp, humidity, pressure)
+        self.measurements_changed(woken)
+
+    def set_measurements_batch(self, temps, humidities, pressures):
+        """Take a block of readings given as array-like columns."""
+        if not len(temps) == len(humidities) == len(pressures):
+            raise ValueError("Measurement columns must be the same length.")
+        if not len(temps):
+            return
+        readings = BatchReplay(self, temps, humidities, pressures)
+        notify_batch = getattr(self.subject, "notify_observers_batch", None)
+        if notify_batch is not None:
+            notify_batch(readings)
+        else:
+            for _ in readings:
+                self.subject.notify_observers()
+
+    def _publish(self, temp, humidity, pressure, step=1):
+        """Publish a reading; return its snapshot and the subscribers it wakes.
+
+        Change detection runs under the write lock, so each reading is
+        compared with the one published just before it. Without a subject
+        that indexes subscriptions, the subscribers woken are None.
+        """
+        with self._write_lock:
+            version = self.snapshot.version + step
+            snapshot = self.snapshot = Snapshot(version, temp, humidity, pressure)
+            woken = None if self._wake is None else self._wake(snapshot[1:])
+        return snapshot, woken
+
+    def register_observer(self, observer, **subscription):
+        self.subject.register_observer(observer, **subscription)
 
     def remove_observer(self, observer):
         self.subject.remove_observer(observer)
 
-    def measurements_changed(self):
-        self.subject.notify_observers()
+    def measurements_changed(self, woken=None):
+        """Notify observers; without `woken` subscribers, notify them all."""
+        if woken is None:
+            self.subject.notify_observers()
+        else:
+            self.subject.notify_woken(woken)
 
 
 class Display:
+    # None means every reading; see Subject.register_observer.
+    fields = None
+    thresholds = None
+
     def __init__(self, weather_data: WeatherData) -> None:
         self.temp = None
         self.humidity = None
         self.pressure = None
+        self.version = 0
         self.weather_data = weather_data
         self.register()
 
@@ -72,14 +238,27 @@ class Display:
         self.pressure = self.weather_data.get_pressure()
         self.display()
 
+    def fresh_snapshot(self):
+        """Return the latest snapshot, or None if this display has seen it."""
+        snapshot = self.weather_data.get_snapshot()
+        if snapshot.version <= self.version:
+            return None
+        self.version = snapshot.version
+        return snapshot
+
     def display(self):
         raise NotImplementedError("Make the display...")
 
 
 class CurrentConditionsDisplay(Display):
+    fields = ("temp", "humidity")
+
     def update(self):
-        self.temp = self.weather_data.get_temp()
-        self.humidity = self.weather_data.get_humidity()
+        snapshot = self.fresh_snapshot()
+        if snapshot is None:
+            return
+        self.temp = snapshot.temp
+        self.humidity = snapshot.humidity
         self.display()
 
     def display(self):
@@ -87,40 +266,79 @@ class CurrentConditionsDisplay(Display):
 
 
 class StatisticsDisplay(Display):
-    def __init__(self, weather_data: WeatherData) -> None:
+    def __init__(
+        self,
+        weather_data: WeatherData,
+        window=None,
+        window_seconds=None,
+        quantiles=(),
+    ) -> None:
+        self.stats = RunningStats()
+        self.window = None
+        if window is not None or window_seconds is not None:
+            self.window = SlidingWindow(window, window_seconds)
+        self.quantiles = {q: P2Quantile(q) for q in quantiles}
         super().__init__(weather_data)
-        self.temps = []
 
     def update(self):
-        self.temp = self.weather_data.get_temp()
+        snapshot = self.fresh_snapshot()
+        if snapshot is None:
+            return
+        self.temp = snapshot.temp
+        self.record((self.temp,))
+        self.display()
+
+    def update_batch(self, snapshot, temps, humidities, pressures):
+        self.version = max(self.version, snapshot.version)
+        self.temp = temps[-1]
+        self.record(temps)
         self.display()
 
+    def record(self, temps):
+        self.stats.extend(temps)
+        if self.window is not None:
+            self.window.extend(temps)
+        for sketch in self.quantiles.values():
+            for temp in temps:
+                sketch.add(temp)
+
     def display(self):
-        self.temps.append(self.temp)
-        average_tmp = sum(self.temps) / len(self.temps)
-        min_tmp = min(self.temps)
-        max_tmp = max(self.temps)
-        print(f"Avg/Max/Min temperature = {average_tmp:.1f}/{max_tmp}/{min_tmp}")
+        stats = self.stats
+        print(f"Avg/Max/Min temperature = {stats.mean:.1f}/{stats.max}/{stats.min}")
+        if self.window is not None:
+            window = self.window
+            print(
+                f"Window avg/max/min temperature = "
+                f"{window.mean:.1f}/{window.max}/{window.min}"
+            )
+        for quantile, sketch in self.quantiles.items():
+            print(f"p{quantile * 100:g} temperature ~ {sketch.value:.1f}")
 
 
 class ForecastDisplay(Display):
-    def __init__(self, weather_data: WeatherData) -> None:
+    def __init__(
+        self, weather_data: WeatherData, capacity=256, clock=time.time
+    ) -> None:
+        self.engine = ForecastEngine(capacity)
+        self.clock = clock
         super().__init__(weather_data)
         self.previous_temp = None
         self.previous_humidity = None
         self.previous_pressure = None
 
     def update(self):
-        self.temp = self.weather_data.get_temp()
-        self.humidity = self.weather_data.get_humidity()
-        self.pressure = self.weather_data.get_pressure()
+        snapshot = self.fresh_snapshot()
+        if snapshot is None:
+            return
+        _, self.temp, self.humidity, self.pressure = snapshot
+        self.engine.add(self.clock(), self.temp, self.humidity, self.pressure)
         self.display()
 
     def display(self):
-        print("Forecast: I'm not sure how to implement this...")
+        print(f"Forecast: {self.engine.forecast()}")
         self.previous_temp = self.temp
         self.previous_humidity = self.humidity
-        self.previous_pressure = self.previous_pressure
+        self.previous_pressure = self.pressure
 
 
 if __name__ == "__main__":
@@ -1,30 +1,84 @@
 """Weather station app."""
+import time
 
+from weather_history import ForecastEngine
+from weather_statistics import P2Quantile, RunningStats, SlidingWindow
+from weather_subscriptions import SubjectBase, in_order
 
-class Subject:
-    def __init__(self) -> None:
-        self.observers = set()
-
-    def register_observer(self, observer):
-        self.observers.add(observer)
-
-    def remove_observer(self, observer):
-        self.observers.discard(observer)
 
+class Subject(SubjectBase):
     def notify_observer(self, observer, temp, humidity, pressure):
-        observer.update(temp, humidity, pressure)
+        limit = self.limits.get(observer)
+        if limit is None:
+            # The common case, kept inline: it runs per observer per reading.
+            if self._timed:
+                self.metrics.call(observer, observer.update, temp, humidity, pressure)
+            else:
+                observer.update(temp, humidity, pressure)
+            return
+        for reading in limit.offer((temp, humidity, pressure)):
+            if self._timed:
+                self.metrics.call(observer, observer.update, *reading)
+            else:
+                observer.update(*reading)
 
     def notify_observers(self, temp, humidity, pressure):
+        self._notify(self.observers, (temp, humidity, pressure))
+
+    def _notify(self, observers, reading):
+        """Notify an ObserverRegistry and the subscribers `reading` wakes.
+
+        Everyone is notified in registration order. With metrics, one
+        notification in a sample is timed, and an error is recorded against
+        the observer that raised it.
+        """
+        temp, humidity, pressure = reading
+        woken = self.subscriptions.wake(reading)
+        if woken:
+            observers = in_order(observers.ordered(), woken)
+        metrics = self.metrics
+        if metrics is None:
+            for observer in observers:
+                self.notify_observer(observer, temp, humidity, pressure)
+            return
+        self._timed = metrics.sample()
+        observer = None
+        try:
+            for observer in observers:
+                self.notify_observer(observer, temp, humidity, pressure)
+        except Exception as error:
+            if not self._timed:
+                metrics.failed(observer, error)
+            raise
+        finally:
+            self._timed = False
+
+    def notify_observers_batch(self, temps, humidities, pressures):
+        """Send observers with update_batch() the whole batch in one call.
+
+        Other observers get the readings replayed one at a time, and
+        subscribers only the readings that change what they subscribed to.
+        """
+        batched = []
         for observer in self.observers:
-            self.notify_observer(observer, temp, humidity, pressure)
+            update_batch = getattr(observer, "update_batch", None)
+            if update_batch is not None and observer not in self.limits:
+                self._deliver(observer, update_batch, temps, humidities, pressures)
+                batched.append(observer)
+        legacy = self.observers.without(batched)
+        if not legacy and not self.subscriptions:
+            self.subscriptions.seen((temps[-1], humidities[-1], pressures[-1]))
+            return
+        for reading in zip(temps, humidities, pressures):
+            self._notify(legacy, reading)
 
 
 class WeatherData:
-    def __init__(self) -> None:
+    def __init__(self, subject=None) -> None:
         self.temp = None
         self.humidity = None
         self.pressure = None
-        self.subject = Subject()
+        self.subject = Subject() if subject is None else subject
 
     def get_temp(self):
         pass
@@ -41,8 +95,24 @@ class WeatherData:
         self.pressure = pressure
         self.measurements_changed()
 
-    def register_observer(self, observer):
-        self.subject.register_observer(observer)
+    def set_measurements_batch(self, temps, humidities, pressures):
+        """Take a block of readings given as array-like columns."""
+        if not len(temps) == len(humidities) == len(pressures):
+            raise ValueError("Measurement columns must be the same length.")
+        if not len(temps):
+            return
+        self.temp = temps[-1]
+        self.humidity = humidities[-1]
+        self.pressure = pressures[-1]
+        notify_batch = getattr(self.subject, "notify_observers_batch", None)
+        if notify_batch is not None:
+            notify_batch(temps, humidities, pressures)
+            return
+        for reading in zip(temps, humidities, pressures):
+            self.subject.notify_observers(*reading)
+
+    def register_observer(self, observer, **subscription):
+        self.subject.register_observer(observer, **subscription)
 
     def remove_observer(self, observer):
         self.subject.remove_observer(observer)
@@ -52,6 +122,10 @@ class WeatherData:
 
 
 class Display:
+    # None means every reading; see Subject.register_observer.
+    fields = None
+    thresholds = None
+
     def __init__(self, weather_data: WeatherData) -> None:
         self.temp = None
         self.humidity = None
@@ -76,35 +150,76 @@ class Display:
 
 
 class CurrentConditionsDisplay(Display):
+    fields = ("temp", "humidity")
+
     def display(self):
         print(f"Current conditions... temp: {self.temp}, humidity: {self.humidity}")
 
 
 class StatisticsDisplay(Display):
-    def __init__(self, weather_data: WeatherData) -> None:
+    def __init__(
+        self,
+        weather_data: WeatherData,
+        window=None,
+        window_seconds=None,
+        quantiles=(),
+    ) -> None:
+        self.stats = RunningStats()
+        self.window = None
+        if window is not None or window_seconds is not None:
+            self.window = SlidingWindow(window, window_seconds)
+        self.quantiles = {q: P2Quantile(q) for q in quantiles}
         super().__init__(weather_data)
-        self.temps = []
+
+    def update(self, temp, humidity, pressure):
+        self.record((temp,))
+        super().update(temp, humidity, pressure)
+
+    def update_batch(self, temps, humidities, pressures):
+        self.record(temps)
+        super().update(temps[-1], humidities[-1], pressures[-1])
+
+    def record(self, temps):
+        self.stats.extend(temps)
+        if self.window is not None:
+            self.window.extend(temps)
+        for sketch in self.quantiles.values():
+            for temp in temps:
+                sketch.add(temp)
 
     def display(self):
-        self.temps.append(self.temp)
-        average_tmp = sum(self.temps) / len(self.temps)
-        min_tmp = min(self.temps)
-        max_tmp = max(self.temps)
-        print(f"Avg/Max/Min temperature = {average_tmp:.1f}/{max_tmp}/{min_tmp}")
+        stats = self.stats
+        print(f"Avg/Max/Min temperature = {stats.mean:.1f}/{stats.max}/{stats.min}")
+        if self.window is not None:
+            window = self.window
+            print(
+                f"Window avg/max/min temperature = "
+                f"{window.mean:.1f}/{window.max}/{window.min}"
+            )
+        for quantile, sketch in self.quantiles.items():
+            print(f"p{quantile * 100:g} temperature ~ {sketch.value:.1f}")
 
 
 class ForecastDisplay(Display):
-    def __init__(self, weather_data: WeatherData) -> None:
+    def __init__(
+        self, weather_data: WeatherData, capacity=256, clock=time.time
+    ) -> None:
+        self.engine = ForecastEngine(capacity)
+        self.clock = clock
         super().__init__(weather_data)
         self.previous_temp = None
         self.previous_humidity = None
         self.previous_pressure = None
 
+    def update(self, temp, humidity, pressure):
+        self.engine.add(self.clock(), temp, humidity, pressure)
+        super().update(temp, humidity, pressure)
+
     def display(self):
-        print("Forecast: I'm not sure how to implement this...")
+        print(f"Forecast: {self.engine.forecast()}")
         self.previous_temp = self.temp
         self.previous_humidity = self.humidity
-        self.previous_pressure = self.previous_pressure
+        self.previous_pressure = self.pressure
 
 
 if __name__ == "__main__":
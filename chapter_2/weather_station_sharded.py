@@ -0,0 +1,298 @@
+"""Observer pattern: many weather stations sharded across processes.
+
+Stations are numbered and partitioned across worker processes by
+station % shards. Each shard owns a push WeatherData per station, and the
+observers of a station run in the shard that owns it. Measurements reach a
+shard through a ReadingRing in shared memory rather than as pickled messages.
+Only the periodic per-station summaries travel over a queue, to the
+coordinator, ShardedStations, which merges them into cross-station statistics.
+"""
+import array
+import multiprocessing
+import os
+import queue
+import random
+import struct
+import time
+from multiprocessing import shared_memory
+
+from weather_station_push import WeatherData
+from weather_statistics import RunningStats
+from weather_subscriptions import FIELDS
+
+STOP = 2**64 - 1
+
+
+class ReadingRing:
+    """Single-producer, single-consumer ring of readings in shared memory.
+
+    The block holds a 64-byte header of (capacity, head, tail) counters and
+    then one column per field: station ids as uint64, measurements as
+    float64. Only the producer moves head and only the consumer moves tail,
+    each after copying its slots, so no lock is needed. Batches are copied
+    a column slice at a time.
+    """
+
+    HEADER = 64
+
+    def __init__(self, capacity=1 << 16, name=None) -> None:
+        if name is None:
+            size = self.HEADER + 8 * capacity * (1 + len(FIELDS))
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+            self._owner = True
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self._owner = False
+        buffer = self.memory.buf
+        self.counters = buffer[: struct.calcsize("3Q")].cast("Q")
+        if self._owner:
+            self.counters[0] = capacity
+            self.counters[1] = self.counters[2] = 0
+        self.capacity = self.counters[0]
+        column = 8 * self.capacity
+        offsets = range(self.HEADER, self.HEADER + column * (1 + len(FIELDS)), column)
+        self.columns = [
+            buffer[offset : offset + column].cast("Q" if i == 0 else "d")
+            for i, offset in enumerate(offsets)
+        ]
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def __len__(self) -> int:
+        return self.counters[1] - self.counters[2]
+
+    def put_many(self, stations, temps, humidities, pressures):
+        """Copy in as many readings as fit and return how many that was."""
+        head, tail = self.counters[1], self.counters[2]
+        count = min(len(stations), self.capacity - (head - tail))
+        done = 0
+        values = (stations, temps, humidities, pressures)
+        while done < count:
+            start = (head + done) % self.capacity
+            run = min(count - done, self.capacity - start)
+            for column, source in zip(self.columns, values):
+                column[start : start + run] = array.array(
+                    column.format, source[done : done + run]
+                )
+            done += run
+        self.counters[1] = head + count
+        return count
+
+    def get_many(self, limit=None):
+        """Take up to `limit` readings as (stations, temps, humidities, pressures)."""
+        head, tail = self.counters[1], self.counters[2]
+        count = head - tail if limit is None else min(head - tail, limit)
+        taken = [[] for _ in self.columns]
+        done = 0
+        while done < count:
+            start = (tail + done) % self.capacity
+            run = min(count - done, self.capacity - start)
+            for column, values in zip(self.columns, taken):
+                values.extend(column[start : start + run].tolist())
+            done += run
+        self.counters[2] = tail + count
+        return taken
+
+    def close(self):
+        for view in (self.counters, *self.columns):
+            view.release()
+        self.memory.close()
+        if self._owner:
+            self.memory.unlink()
+
+
+class StationSummary:
+    """Running statistics of every field at one station."""
+
+    def __init__(self, weather_data: WeatherData) -> None:
+        self.stats = tuple(RunningStats() for _ in FIELDS)
+        weather_data.register_observer(self)
+
+    def update(self, *reading):
+        for stats, value in zip(self.stats, reading):
+            stats.add(value)
+
+    def update_batch(self, *columns):
+        for stats, values in zip(self.stats, columns):
+            stats.extend(values)
+
+
+class Station:
+    """One station in a shard: its WeatherData and the observers it keeps alive."""
+
+    def __init__(self, station, observers=None) -> None:
+        self.weather_data = WeatherData()
+        self.summary = StationSummary(self.weather_data)
+        self.observers = []
+        if observers is not None:
+            self.observers = list(observers(self.weather_data, station))
+
+
+def run_shard(shard, ring_name, summaries, observers=None, report_every=1.0):
+    """Worker loop: feed each station its readings until STOP comes through.
+
+    `observers(weather_data, station)` returns the observers for a station;
+    it must be a module-level function so it can be sent to the worker.
+    """
+    ring = ReadingRing(name=ring_name)
+    stations = {}
+    next_report = time.monotonic() + report_every
+    idle = 0
+    running = True
+    try:
+        while running:
+            columns = ring.get_many()
+            if not columns[0]:
+                idle += 1
+                time.sleep(0 if idle < 100 else 0.0005)
+            else:
+                idle = 0
+            groups = {}
+            for reading in zip(*columns):
+                if reading[0] == STOP:
+                    running = False
+                    break
+                groups.setdefault(reading[0], []).append(reading[1:])
+            for station, readings in groups.items():
+                if station not in stations:
+                    stations[station] = Station(station, observers)
+                temps, humidities, pressures = zip(*readings)
+                weather_data = stations[station].weather_data
+                weather_data.set_measurements_batch(temps, humidities, pressures)
+            now = time.monotonic()
+            if now >= next_report or not running:
+                summary = {id_: s.summary.stats for id_, s in stations.items()}
+                summaries.put((shard, not running, summary))
+                next_report = now + report_every
+    finally:
+        ring.close()
+
+
+class ShardedStations:
+    """Coordinator: routes readings to shards and merges their statistics."""
+
+    def __init__(
+        self, shards=None, capacity=1 << 16, observers=None, report_every=1.0
+    ) -> None:
+        self.shards = shards or os.cpu_count() or 1
+        self.capacity = capacity
+        self.observers = observers
+        self.report_every = report_every
+        self.rings = []
+        self.workers = []
+        self.summaries = multiprocessing.Queue()
+        self.latest = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def shard_of(self, station):
+        return station % self.shards
+
+    def start(self):
+        for shard in range(self.shards):
+            ring = ReadingRing(self.capacity)
+            worker = multiprocessing.Process(
+                target=run_shard,
+                args=(shard, ring.name, self.summaries),
+                kwargs={"observers": self.observers, "report_every": self.report_every},
+                daemon=True,
+            )
+            worker.start()
+            self.rings.append(ring)
+            self.workers.append(worker)
+
+    def set_measurements(self, station, temp, humidity, pressure):
+        self._put(self.shard_of(station), [station], [temp], [humidity], [pressure])
+
+    def set_measurements_batch(self, stations, temps, humidities, pressures):
+        """Route columns of readings, keeping each station's readings in order."""
+        parts = [([], [], [], []) for _ in range(self.shards)]
+        for reading in zip(stations, temps, humidities, pressures):
+            for column, value in zip(parts[reading[0] % self.shards], reading):
+                column.append(value)
+        for shard, columns in enumerate(parts):
+            if columns[0]:
+                self._put(shard, *columns)
+
+    def _put(self, shard, *columns):
+        ring, worker = self.rings[shard], self.workers[shard]
+        done, idle = 0, 0
+        while True:
+            done += ring.put_many(*(column[done:] for column in columns))
+            if done == len(columns[0]):
+                return
+            if not worker.is_alive():
+                raise RuntimeError(f"Shard {shard} exited with {worker.exitcode}.")
+            idle += 1
+            time.sleep(0 if idle < 100 else 0.0005)
+
+    def _drain(self, timeout=None):
+        """Apply queued summaries; return the shard of a final one, if seen."""
+        while True:
+            try:
+                shard, final, summary = self.summaries.get(timeout is not None, timeout)
+            except queue.Empty:
+                return None
+            self.latest.update(summary)
+            if final:
+                return shard
+
+    def station_statistics(self, station):
+        """Return the latest (temp, humidity, pressure) RunningStats of a station."""
+        self._drain()
+        return self.latest.get(station)
+
+    def statistics(self):
+        """Return {field: RunningStats} merged over every station reported so far."""
+        self._drain()
+        merged = {field: RunningStats() for field in FIELDS}
+        for stats in self.latest.values():
+            for field, field_stats in zip(FIELDS, stats):
+                merged[field].merge(field_stats)
+        return merged
+
+    def stop(self):
+        """Let every shard finish its readings, then collect the final summaries."""
+        for shard in range(len(self.rings)):
+            self._put(shard, [STOP], [0.0], [0.0], [0.0])
+        finished = set()
+        while len(finished) < len(self.workers):
+            if not any(worker.is_alive() for worker in self.workers):
+                self._drain()
+                break
+            shard = self._drain(timeout=0.1)
+            if shard is not None:
+                finished.add(shard)
+        for worker in self.workers:
+            worker.join()
+        for ring in self.rings:
+            ring.close()
+        self.rings, self.workers = [], []
+
+
+if __name__ == "__main__":
+    stations, readings = 2000, 200_000
+    rng = random.Random(0)
+    ids = [rng.randrange(stations) for _ in range(readings)]
+    temps = [rng.uniform(-10, 40) for _ in range(readings)]
+    humidities = [rng.uniform(0, 100) for _ in range(readings)]
+    pressures = [rng.uniform(980, 1040) for _ in range(readings)]
+    with ShardedStations(shards=4) as sharded:
+        start = time.perf_counter()
+        for i in range(0, readings, 10_000):
+            block = slice(i, i + 10_000)
+            sharded.set_measurements_batch(
+                ids[block], temps[block], humidities[block], pressures[block]
+            )
+    elapsed = time.perf_counter() - start
+    temp = sharded.statistics()["temp"]
+    print(f"{temp.count} readings from {len(sharded.latest)} stations")
+    print(f"Avg/Max/Min temperature = {temp.mean:.1f}/{temp.max:.1f}/{temp.min:.1f}")
+    print(f"{readings / elapsed:,.0f} readings/s across {sharded.shards} shards")
@@ -0,0 +1,149 @@
+"""Observer pattern: weather station with thread-pool dispatch.
+
+ExecutorSubject works with both the push and the pull WeatherData. Updates run
+on a thread pool, but each observer has its own lane: it sees readings in the
+order they were notified and never runs two update() calls at once. A failing
+observer is reported without holding up delivery to the others.
+"""
+import collections
+import concurrent.futures
+import threading
+
+
+class Delivery:
+    """One notification's outcome at every observer it was sent to."""
+
+    def __init__(self, futures) -> None:
+        self.futures = futures
+
+    def wait(self, timeout=None):
+        concurrent.futures.wait(list(self.futures.values()), timeout)
+        return self
+
+    def done(self):
+        return all(future.done() for future in self.futures.values())
+
+    def failures(self):
+        """Return {observer: exception} for the observers that raised."""
+        return {
+            observer: future.exception()
+            for observer, future in self.futures.items()
+            if future.done() and future.exception() is not None
+        }
+
+
+class ObserverLane:
+    """Runs one observer's updates one at a time, in notification order."""
+
+    def __init__(self, observer, subject) -> None:
+        self.observer = observer
+        self.subject = subject
+        self.pending = collections.deque()
+        self.running = False
+        self.last = None
+        self._lock = threading.Lock()
+
+    def submit(self, args):
+        future = concurrent.futures.Future()
+        with self._lock:
+            self.pending.append((args, future))
+            self.last = future
+            if self.running:
+                return future
+            self.running = True
+        self.subject.executor.submit(self.run_next)
+        return future
+
+    def run_next(self):
+        # Handle one update per pool task, then queue the rest behind other
+        # lanes so a busy observer cannot hog the pool.
+        with self._lock:
+            args, future = self.pending.popleft()
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(self.observer.update(*args))
+                except Exception as error:
+                    future.set_exception(error)
+                    self.subject.report_failure(self.observer, args, error)
+        finally:
+            # Whatever happened above, the lane must not stay marked running.
+            self._schedule_next()
+
+    def _schedule_next(self):
+        with self._lock:
+            if not self.pending:
+                self.running = False
+                return
+        self.subject.executor.submit(self.run_next)
+
+
+class ExecutorSubject:
+    def __init__(self, max_workers=None, executor=None, on_error=None) -> None:
+        self.executor = executor or concurrent.futures.ThreadPoolExecutor(
+            max_workers, thread_name_prefix="observer"
+        )
+        self.observers = {}
+        self.failures = collections.deque(maxlen=1000)
+        self.on_error = on_error
+        self._lock = threading.Lock()
+
+    def register_observer(self, observer):
+        with self._lock:
+            if observer not in self.observers:
+                self.observers[observer] = ObserverLane(observer, self)
+
+    def remove_observer(self, observer):
+        with self._lock:
+            self.observers.pop(observer, None)
+
+    def notify_observers(self, *args) -> Delivery:
+        with self._lock:
+            lanes = list(self.observers.values())
+        return Delivery({lane.observer: lane.submit(args) for lane in lanes})
+
+    def report_failure(self, observer, args, error):
+        self.failures.append((observer, args, error))
+        if self.on_error is not None:
+            try:
+                self.on_error(observer, args, error)
+            except Exception as handler_error:
+                # Recorded against the same update; its __context__ is `error`.
+                self.failures.append((observer, args, handler_error))
+
+    def join(self, timeout=None):
+        """Wait for every update notified so far to finish."""
+        with self._lock:
+            lasts = [lane.last for lane in self.observers.values() if lane.last]
+        concurrent.futures.wait(lasts, timeout)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait)
+
+
+if __name__ == "__main__":
+    import weather_station_pull
+    import weather_station_push
+
+    class BrokenDisplay(weather_station_push.Display):
+        def display(self):
+            raise RuntimeError("display unplugged")
+
+    subject = ExecutorSubject(max_workers=4)
+    weather_data = weather_station_push.WeatherData(subject)
+    weather_station_push.CurrentConditionsDisplay(weather_data)
+    weather_station_push.StatisticsDisplay(weather_data)
+    BrokenDisplay(weather_data)
+    weather_data.set_measurements(1, 2, 3)
+    delivery = subject.notify_observers(75, 30, 10).wait()
+    print(f"Failures: {delivery.failures()}")
+    subject.join()
+    print(f"{len(subject.failures)} failures reported")
+    subject.shutdown()
+
+    subject = ExecutorSubject(max_workers=4)
+    weather_data = weather_station_pull.WeatherData(subject)
+    weather_station_pull.CurrentConditionsDisplay(weather_data)
+    weather_data.set_measurements(80, 40, 12)
+    subject.join()
+    subject.shutdown()
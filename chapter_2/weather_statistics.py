@@ -0,0 +1,213 @@
+"""Constant-time statistics for streams of measurements."""
+import bisect
+import collections
+import math
+import time
+
+
+class RunningStats:
+    """All-time count, mean, variance, min and max, updated in O(1)."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        # Welford's update keeps the variance stable over long streams.
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+
+    def extend(self, values):
+        """Add a whole batch with one pass of builtins per aggregate."""
+        values = list(values)
+        if not values:
+            return
+        count = len(values)
+        # Starting the sum at the running total adds in the same order as
+        # add() would, so the mean stays identical.
+        self.total = sum(values, self.total)
+        low, high = min(values), max(values)
+        if self.min is None or low < self.min:
+            self.min = low
+        if self.max is None or high > self.max:
+            self.max = high
+        batch_mean = math.fsum(values) / count
+        batch_m2 = math.fsum((value - batch_mean) ** 2 for value in values)
+        self._merge_moments(count, batch_mean, batch_m2)
+
+    def merge(self, other):
+        """Fold in another RunningStats, as if its values were added here."""
+        if not other.count:
+            return self
+        self.total += other.total
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+        self._merge_moments(other.count, other._mean, other._m2)
+        return self
+
+    def _merge_moments(self, count, mean, m2):
+        # Chan et al.'s pairwise merge of two means and M2s.
+        delta = mean - self._mean
+        merged = self.count + count
+        self._mean += delta * count / merged
+        self._m2 += m2 + delta * delta * self.count * count / merged
+        self.count = merged
+
+    @property
+    def mean(self):
+        # total / count matches sum(values) / len(values) exactly.
+        return self.total / self.count if self.count else None
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.variance)
+
+
+class SlidingWindow:
+    """Mean, min and max over the last `size` values and/or `seconds`.
+
+    Min and max come from monotonic deques, so every operation is O(1)
+    amortized however long the window is.
+    """
+
+    def __init__(self, size=None, seconds=None, clock=time.monotonic) -> None:
+        if size is None and seconds is None:
+            raise ValueError("Give a window size, a duration or both.")
+        self.size = size
+        self.seconds = seconds
+        self.clock = clock
+        self.total = 0
+        self._values = collections.deque()
+        self._mins = collections.deque()
+        self._maxes = collections.deque()
+        self._added = 0
+        self._evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def extend(self, values, timestamp=None):
+        for value in values:
+            self.add(value, timestamp)
+
+    def add(self, value, timestamp=None):
+        now = self.clock() if timestamp is None else timestamp
+        index = self._added
+        self._added += 1
+        self._values.append((now, value))
+        self.total += value
+        while self._mins and self._mins[-1][1] > value:
+            self._mins.pop()
+        self._mins.append((index, value))
+        while self._maxes and self._maxes[-1][1] < value:
+            self._maxes.pop()
+        self._maxes.append((index, value))
+        self.expire(now)
+
+    def expire(self, now=None):
+        """Drop values that fell out of the window."""
+        now = self.clock() if now is None else now
+        values = self._values
+        while values and (
+            (self.size is not None and len(values) > self.size)
+            or (self.seconds is not None and values[0][0] <= now - self.seconds)
+        ):
+            _, value = values.popleft()
+            self.total -= value
+            if self._mins[0][0] == self._evicted:
+                self._mins.popleft()
+            if self._maxes[0][0] == self._evicted:
+                self._maxes.popleft()
+            self._evicted += 1
+
+    @property
+    def mean(self):
+        return self.total / len(self._values) if self._values else None
+
+    @property
+    def min(self):
+        return self._mins[0][1] if self._mins else None
+
+    @property
+    def max(self):
+        return self._maxes[0][1] if self._maxes else None
+
+
+class P2Quantile:
+    """Streaming estimate of one quantile in constant memory.
+
+    Implements the P-square algorithm (Jain & Chlamtac, 1985): five markers
+    track the min, the max, the quantile and two points either side of it.
+    """
+
+    def __init__(self, quantile) -> None:
+        self.quantile = quantile
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * quantile, 1 + 4 * quantile, 3 + 2 * quantile, 5]
+        self.increments = [0, quantile / 2, quantile, (1 + quantile) / 2, 1]
+
+    def add(self, value):
+        heights = self.heights
+        if len(heights) < 5:
+            bisect.insort(heights, value)
+            return
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = bisect.bisect_right(heights, value) - 1
+        for marker in range(cell + 1, 5):
+            self.positions[marker] += 1
+        for marker in range(5):
+            self.desired[marker] += self.increments[marker]
+        for marker in (1, 2, 3):
+            self._adjust(marker)
+
+    def _adjust(self, i):
+        n, q = self.positions, self.heights
+        offset = self.desired[i] - n[i]
+        if not (
+            (offset >= 1 and n[i + 1] - n[i] > 1)
+            or (offset <= -1 and n[i - 1] - n[i] < -1)
+        ):
+            return
+        d = 1 if offset > 0 else -1
+        parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+        if q[i - 1] < parabolic < q[i + 1]:
+            q[i] = parabolic
+        else:
+            q[i] = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+        n[i] += d
+
+    @property
+    def value(self):
+        if not self.heights:
+            return None
+        if len(self.heights) < 5:
+            rank = round(self.quantile * (len(self.heights) - 1))
+            return self.heights[rank]
+        return self.heights[2]
@@ -0,0 +1,372 @@
+"""Subscription options for weather subjects.
+
+ObserverRegistry holds observers by weak reference, SubscriptionIndex handles
+field-level subscriptions and change detection, and RateLimit throttles or
+debounces one observer's notifications. A registry and an index that share
+one counter number their observers in a single registration order, and
+in_order() merges them back into it. SubjectBase puts these together for the
+push and pull Subjects.
+"""
+import bisect
+import heapq
+import itertools
+import operator
+import time
+import weakref
+
+from weather_metrics import ObserverMetrics
+
+FIELDS = ("temp", "humidity", "pressure")
+
+
+def in_order(*streams):
+    """Merge sorted (registration number, observer) streams into observers."""
+    for _, observer in heapq.merge(*streams, key=operator.itemgetter(0)):
+        yield observer
+
+
+class ObserverRegistry:
+    """Observers held by weak reference, iterated in registration order.
+
+    An observer that is garbage collected drops out by itself, so a display
+    that is never unregistered can't leak or keep receiving readings. Add,
+    discard and membership tests are O(1) on a dict from weak reference to
+    registration number, drawn from `order`.
+    """
+
+    def __init__(self, order=None) -> None:
+        self._refs = {}
+        self._order = itertools.count() if order is None else order
+
+    def __len__(self) -> int:
+        return len(self._refs)
+
+    def __contains__(self, observer) -> bool:
+        return weakref.ref(observer) in self._refs
+
+    def __iter__(self):
+        # Iterate over a copy: observers may unregister, or be collected,
+        # while a notification is running.
+        for ref in list(self._refs):
+            observer = ref()
+            if observer is not None:
+                yield observer
+
+    def ordered(self):
+        """Yield (registration number, observer) pairs in registration order."""
+        for ref, order in list(self._refs.items()):
+            observer = ref()
+            if observer is not None:
+                yield order, observer
+
+    def without(self, observers):
+        """Return a registry of the other observers, keeping their numbers."""
+        skip = {weakref.ref(observer) for observer in observers}
+        rest = ObserverRegistry(self._order)
+        rest._refs = {ref: n for ref, n in self._refs.items() if ref not in skip}
+        return rest
+
+    def add(self, observer):
+        ref = weakref.ref(observer, self._forget)
+        if ref not in self._refs:
+            self._refs[ref] = next(self._order)
+
+    def discard(self, observer):
+        self._refs.pop(weakref.ref(observer), None)
+
+    def _forget(self, ref):
+        self._refs.pop(ref, None)
+
+
+class SubscriptionIndex:
+    """Finds the observers that care about what changed in a reading.
+
+    An observer subscribes to some fields, and is woken when any of them
+    changes value. It can also subscribe to threshold levels on a field, and
+    is then woken whenever the field crosses one of them. A crossing means
+    the field moves between below a level and at-or-above it. Lookups are
+    keyed by field, so observers of unchanged fields are never visited.
+    Like ObserverRegistry, the index only holds weak references, and numbers
+    observers from `order`.
+    """
+
+    def __init__(self, order=None) -> None:
+        self.by_field = {field: set() for field in FIELDS}
+        self.levels = {field: [] for field in FIELDS}
+        self.by_level = {field: {} for field in FIELDS}
+        self.subscriptions = {}
+        self.last = None
+        self._order = itertools.count() if order is None else order
+
+    def __len__(self) -> int:
+        return len(self.subscriptions)
+
+    def __contains__(self, observer) -> bool:
+        return weakref.ref(observer) in self.subscriptions
+
+    def __iter__(self):
+        return (observer for _, observer in self.ordered())
+
+    def ordered(self):
+        """Return (registration number, observer) pairs in registration order."""
+        return self._live(
+            [(entry[0], ref) for ref, entry in self.subscriptions.items()]
+        )
+
+    def add(self, observer, fields=(), thresholds=None):
+        """Subscribe `observer` to `fields` and {field: levels} `thresholds`."""
+        fields = tuple(fields)
+        thresholds = {
+            field: tuple(levels) for field, levels in (thresholds or {}).items()
+        }
+        unknown = (set(fields) | set(thresholds)) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}.")
+        self.discard(observer)
+        ref = weakref.ref(observer, self._forget)
+        self.subscriptions[ref] = (next(self._order), fields, thresholds)
+        for field in fields:
+            self.by_field[field].add(ref)
+        for field, levels in thresholds.items():
+            for level in levels:
+                watchers = self.by_level[field].get(level)
+                if watchers is None:
+                    watchers = self.by_level[field][level] = set()
+                    bisect.insort(self.levels[field], level)
+                watchers.add(ref)
+
+    def discard(self, observer):
+        self._forget(weakref.ref(observer))
+
+    def subscription(self, observer):
+        """Return the (fields, thresholds) `observer` subscribed with, or None."""
+        entry = self.subscriptions.get(weakref.ref(observer))
+        return None if entry is None else entry[1:]
+
+    def seen(self, reading):
+        """Remember `reading` as the latest without waking anyone."""
+        self.last = tuple(reading)
+
+    def wake(self, reading):
+        """Record `reading` and return the observers it should wake.
+
+        Field subscribers get the first reading. Threshold subscribers wait
+        for a crossing, which needs a previous value to compare against.
+        Observers come back as (registration number, observer) pairs, in
+        registration order.
+        """
+        previous, self.last = self.last, tuple(reading)
+        if not self.subscriptions:
+            return []
+        if previous is None:
+            previous = (None,) * len(FIELDS)
+        woken = set()
+        for field, old, new in zip(FIELDS, previous, self.last):
+            if old == new:
+                continue
+            woken |= self.by_field[field]
+            levels = self.levels[field]
+            if old is None or new is None or not levels:
+                continue
+            low, high = (old, new) if old < new else (new, old)
+            start = bisect.bisect_right(levels, low)
+            stop = bisect.bisect_right(levels, high)
+            for level in levels[start:stop]:
+                woken |= self.by_level[field][level]
+        order = self.subscriptions
+        # Registration numbers are unique, so refs are never compared.
+        return self._live(sorted((order[ref][0], ref) for ref in woken))
+
+    def _live(self, entries):
+        live = []
+        for order, ref in entries:
+            observer = ref()
+            if observer is not None:
+                live.append((order, observer))
+        return live
+
+    def _forget(self, ref):
+        subscription = self.subscriptions.pop(ref, None)
+        if subscription is None:
+            return
+        _, fields, thresholds = subscription
+        for field in fields:
+            self.by_field[field].discard(ref)
+        for field, levels in thresholds.items():
+            for level in levels:
+                watchers = self.by_level[field].get(level)
+                if watchers is None:
+                    continue
+                watchers.discard(ref)
+                if not watchers:
+                    del self.by_level[field][level]
+                    self.levels[field].remove(level)
+
+
+class RateLimit:
+    """Throttles or debounces one observer, keeping only the latest reading.
+
+    With `throttle`, the observer is notified at most once per `throttle`
+    seconds. With `debounce`, it is notified once readings have been quiet for
+    `debounce` seconds. Readings that arrive in between are conflated: each
+    replaces the pending one, which counts as suppressed. Readings are the
+    argument tuples passed on to update(). Nothing runs on a timer, so
+    pending readings go out on the next offer() or poll().
+    """
+
+    def __init__(self, throttle=None, debounce=None, clock=time.monotonic):
+        if (throttle is None) == (debounce is None):
+            raise ValueError("Give exactly one of throttle or debounce.")
+        self.throttle = throttle
+        self.debounce = debounce
+        self.clock = clock
+        self.pending = None
+        self.last_arrival = None
+        self.last_delivery = None
+        self.delivered = 0
+        self.suppressed = 0
+
+    def offer(self, reading):
+        """Take a new reading and return the readings to deliver now."""
+        now = self.clock()
+        ready = []
+        if self.debounce is not None and self._due(now):
+            ready.append(self._take(now))
+        if self.pending is not None:
+            self.suppressed += 1
+        self.pending = reading
+        self.last_arrival = now
+        if self.throttle is not None and self._due(now):
+            ready.append(self._take(now))
+        return ready
+
+    def poll(self):
+        """Return the pending reading if it is due now, else None."""
+        now = self.clock()
+        return self._take(now) if self._due(now) else None
+
+    def flush(self):
+        """Return the pending reading, due or not, or None."""
+        return None if self.pending is None else self._take(self.clock())
+
+    def _due(self, now):
+        if self.pending is None:
+            return False
+        if self.debounce is not None:
+            return now - self.last_arrival >= self.debounce
+        return self.last_delivery is None or now - self.last_delivery >= self.throttle
+
+    def _take(self, now):
+        reading, self.pending = self.pending, None
+        self.last_delivery = now
+        self.delivered += 1
+        return reading
+
+
+class SubjectBase:
+    """Registration, rate limits, metrics and quarantine for weather Subjects.
+
+    Subclasses supply notify_observer() and _notify(), which differ between
+    the push and the pull model.
+    """
+
+    def __init__(self) -> None:
+        # One counter numbers both, so their observers merge back in
+        # registration order.
+        order = itertools.count()
+        self.observers = ObserverRegistry(order)
+        self.subscriptions = SubscriptionIndex(order)
+        self.limits = weakref.WeakKeyDictionary()
+        self.metrics = None
+        self.quarantined = weakref.WeakKeyDictionary()
+        self._timed = False
+
+    def register_observer(
+        self, observer, fields=None, thresholds=None, throttle=None, debounce=None
+    ):
+        """Register for every reading, or only for changes it subscribes to.
+
+        `fields` names the fields whose changes wake the observer, and
+        `thresholds` maps a field to levels whose crossing wakes it. Both
+        default to the observer's own `fields` and `thresholds` attributes.
+        `throttle` or `debounce`, in seconds, rate-limit the observer with a
+        RateLimit; call poll() or flush() to deliver the readings it holds.
+        Observers are held by weak reference and notified in registration
+        order, so keep a reference to any display you want to stay alive.
+        """
+        if fields is None:
+            fields = getattr(observer, "fields", None)
+        if thresholds is None:
+            thresholds = getattr(observer, "thresholds", None)
+        self.remove_observer(observer)
+        if throttle is not None or debounce is not None:
+            self.limits[observer] = RateLimit(throttle, debounce)
+        if fields is None and not thresholds:
+            self.observers.add(observer)
+        else:
+            self.subscriptions.add(observer, fields or (), thresholds)
+
+    def remove_observer(self, observer):
+        self.observers.discard(observer)
+        self.subscriptions.discard(observer)
+        self.limits.pop(observer, None)
+        self.quarantined.pop(observer, None)
+
+    def _deliver(self, observer, update, *args):
+        """Call an update outside a notification, timing it if instrumented."""
+        if self.metrics is None:
+            update(*args)
+        else:
+            self.metrics.call(observer, update, *args)
+
+    def poll(self):
+        """Deliver the held readings of rate-limited observers that are due."""
+        for observer, limit in list(self.limits.items()):
+            reading = limit.poll()
+            if reading is not None:
+                self._deliver(observer, observer.update, *reading)
+
+    def flush(self):
+        """Deliver every held reading, due or not."""
+        for observer, limit in list(self.limits.items()):
+            reading = limit.flush()
+            if reading is not None:
+                self._deliver(observer, observer.update, *reading)
+
+    def stats(self):
+        """Return {observer: (delivered, suppressed)} for rate-limited observers."""
+        return {
+            observer: (limit.delivered, limit.suppressed)
+            for observer, limit in self.limits.items()
+        }
+
+    def instrument(self, quarantine=False, **options):
+        """Start timing observer updates; options go to ObserverMetrics.
+
+        With `quarantine`, an observer flagged as slow stops being notified
+        until release() is called for it.
+        """
+        on_slow = self.quarantine if quarantine else None
+        self.metrics = ObserverMetrics(on_slow=on_slow, **options)
+        return self.metrics
+
+    def quarantine(self, observer):
+        """Stop notifying `observer`, remembering how it was registered."""
+        options = {}
+        subscription = self.subscriptions.subscription(observer)
+        if subscription is not None:
+            options["fields"], options["thresholds"] = subscription
+        limit = self.limits.get(observer)
+        if limit is not None:
+            options["throttle"], options["debounce"] = limit.throttle, limit.debounce
+        self.remove_observer(observer)
+        self.quarantined[observer] = options
+
+    def release(self, observer):
+        """Notify a quarantined observer again, with fresh metrics."""
+        options = self.quarantined.pop(observer, None)
+        if options is None:
+            return
+        self.register_observer(observer, **options)
+        if self.metrics is not None:
+            self.metrics.reset(observer)
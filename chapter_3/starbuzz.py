@@ -1,97 +1,235 @@
 """Decorator pattern: Starbuzz coffee example."""
+import functools
 
 
-class Beverage:
+class FloatPricing:
+    """Price drinks in float dollars, straight from the menu literals."""
+
+    def price(self, item):
+        return item.price
+
+    def add(self, amount, item):
+        return amount + item.price
+
+    def total(self, amounts):
+        return round(sum(amounts), 2)
+
+    def format(self, amount):
+        return f"{amount:.2f}"
+
+
+class CentsPricing:
+    """Price drinks in exact integer cents.
+
+    Each item's price is converted to cents once and cached, so totals never
+    pick up float rounding however many are summed.
+    """
 
     def __init__(self) -> None:
-        self.description = None
-        self.price = 0
+        self._cents = {}
+
+    def price(self, item):
+        cents = self._cents.get(item)
+        if cents is None:
+            cents = self._cents[item] = round(item.price * 100)
+        return cents
+
+    def add(self, amount, item):
+        return amount + self.price(item)
+
+    def total(self, amounts):
+        return sum(amounts)
+
+    def format(self, amount):
+        return f"{amount // 100}.{amount % 100:02d}"
+
+
+FLOAT_PRICING = FloatPricing()
+CENTS_PRICING = CentsPricing()
+
+
+def memoized(method):
+    """Cache a drink's result until the drink's `_stamp()` changes.
+
+    The (stamp, value) pair lives in the drink's `_memo_<name>` slot.
+    """
+    slot = f"_memo_{method.__name__}"
+
+    @functools.wraps(method)
+    def wrapper(self):
+        stamp = self._stamp()
+        cached = getattr(self, slot)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        # Stamped with the value read before computing, so a result that
+        # raced a change is recomputed next time rather than kept.
+        value = method(self)
+        setattr(self, slot, (stamp, value))
+        return value
+
+    return wrapper
+
+
+class Beverage:
+    __slots__ = ()
+    description = None
+    price = 0
+    pricing = FLOAT_PRICING
+    # Bumped whenever a decorator chain or the pricing changes so memoized
+    # results go stale.
+    _generation = 0
+
+    def _stamp(self):
+        return Beverage._generation
 
     def get_description(self):
         return self.description
 
     def cost(self):
-        return self.price
+        return self.pricing.total((self.subtotal(),))
 
+    def subtotal(self):
+        """Add up the chain's prices from the inside out, unrounded."""
+        return self.pricing.price(type(self))
 
-class HouseBlend(Beverage):
 
-    def __init__(self) -> None:
-        super().__init__()
-        self.description = "House blend coffee"
-        self.price = 1.10
+class HouseBlend(Beverage):
+    __slots__ = ()
+    description = "House blend coffee"
+    price = 1.10
 
 
 class DarkRoast(Beverage):
-
-    def __init__(self) -> None:
-        super().__init__()
-        self.description = "Dark Roast coffee"
-        self.price = 0.75
+    __slots__ = ()
+    description = "Dark Roast coffee"
+    price = 0.75
 
 
 class Espresso(Beverage):
-
-    def __init__(self) -> None:
-        super().__init__()
-        self.description = "Espresso coffee"
-        self.price = 2.10
+    __slots__ = ()
+    description = "Espresso coffee"
+    price = 2.10
 
 
 class Decaf(Beverage):
-
-    def __init__(self) -> None:
-        super().__init__()
-        self.description = "Decaf coffee"
-        self.price = 1.25
+    __slots__ = ()
+    description = "Decaf coffee"
+    price = 1.25
 
 
 class CondimentDecorator(Beverage):
+    __slots__ = ("_beverage", "_memo_cost", "_memo_get_description", "_memo_subtotal")
+    description = ""
 
     def __init__(self, beverage) -> None:
-        self.beverage = beverage
-        self.price = 0
-        self.description = ""
+        self._beverage = beverage
+        self._memo_cost = self._memo_get_description = self._memo_subtotal = None
+
+    @property
+    def beverage(self):
+        return self._beverage
 
+    @beverage.setter
+    def beverage(self, beverage):
+        self._beverage = beverage
+        Beverage._generation += 1
+
+    @memoized
     def get_description(self):
-        self.beverage.description += f" + {self.description}"
-        return self.beverage.get_description()
+        return f"{self.beverage.get_description()} + {self.description}"
 
+    @memoized
     def cost(self):
-        self.beverage.price += self.price
-        return self.beverage.cost()
+        return self.pricing.total((self.subtotal(),))
 
+    @memoized
+    def subtotal(self):
+        return self.pricing.add(self.beverage.subtotal(), type(self))
 
-class Milk(CondimentDecorator):
 
-    def __init__(self, beverage) -> None:
-        super().__init__(beverage)
-        self.price = 0.25
-        self.description = "milk"
+class Milk(CondimentDecorator):
+    __slots__ = ()
+    description = "milk"
+    price = 0.25
 
 
 class Mocha(CondimentDecorator):
-
-    def __init__(self, beverage) -> None:
-        super().__init__(beverage)
-        self.price = 0.99
-        self.description = "mocha"
+    __slots__ = ()
+    description = "mocha"
+    price = 0.99
 
 
 class Soy(CondimentDecorator):
-
-    def __init__(self, beverage) -> None:
-        super().__init__(beverage)
-        self.price = 0.45
-        self.description = "soy"
+    __slots__ = ()
+    description = "soy"
+    price = 0.45
 
 
 class Whip(CondimentDecorator):
+    __slots__ = ()
+    description = "whip"
+    price = 0.15
 
-    def __init__(self, beverage) -> None:
-        super().__init__(beverage)
-        self.price = 0.15
-        self.description = "whip"
+
+def set_pricing(pricing):
+    """Switch every drink, compiled or not, to another pricing backend."""
+    Beverage.pricing = pricing
+    Beverage._generation += 1
+
+
+CONDIMENTS = (Milk, Mocha, Soy, Whip)
+CONDIMENT_INDEX = {condiment: index for index, condiment in enumerate(CONDIMENTS)}
+
+
+class CompiledBeverage:
+    """A decorated beverage flattened into its base and condiment counts.
+
+    `counts` lines up with CONDIMENTS. `runs` keeps the (condiment, count)
+    runs from the innermost decorator out, so the description reads the same
+    as the decorator chain it was compiled from.
+    """
+
+    __slots__ = ("base", "counts", "runs")
+
+    def __init__(self, base, counts, runs) -> None:
+        self.base = base
+        self.counts = counts
+        self.runs = runs
+
+    def get_description(self):
+        parts = [self.base.description]
+        for condiment, count in self.runs:
+            parts.extend([condiment.description] * count)
+        return " + ".join(parts)
+
+    def itemized(self):
+        """Return (menu item, amount) pairs for the base and each condiment."""
+        pricing = Beverage.pricing
+        items = [(self.base, pricing.price(self.base))]
+        for condiment, count in zip(CONDIMENTS, self.counts):
+            if count:
+                items.append((condiment, pricing.price(condiment) * count))
+        return items
+
+    def cost(self):
+        return Beverage.pricing.total(amount for _, amount in self.itemized())
+
+
+def compile_beverage(beverage):
+    """Flatten a CondimentDecorator chain without recursing through it."""
+    layers = []
+    while isinstance(beverage, CondimentDecorator):
+        layers.append(type(beverage))
+        beverage = beverage.beverage
+    counts = [0] * len(CONDIMENTS)
+    runs = []
+    for condiment in reversed(layers):
+        counts[CONDIMENT_INDEX[condiment]] += 1
+        if runs and runs[-1][0] is condiment:
+            runs[-1] = (condiment, runs[-1][1] + 1)
+        else:
+            runs.append((condiment, 1))
+    return CompiledBeverage(type(beverage), tuple(counts), tuple(runs))
 
 
 if __name__ == "__main__":
@@ -114,3 +252,14 @@ if __name__ == "__main__":
     # = 2.10 + 0.15 * 3 = 2.55
     print(drink4.cost())
     print(drink4.get_description())
+
+    drink5 = Espresso()
+    for _ in range(5000):
+        drink5 = Whip(drink5)
+    # = 2.10 + 0.15 * 5000 = 752.10, too deep for the decorator chain itself
+    print(compile_beverage(drink5).cost())
+
+    set_pricing(CENTS_PRICING)
+    # = 255 cents, formatted only for display
+    print(drink4.cost())
+    print(CENTS_PRICING.format(drink4.cost()))
@@ -0,0 +1,200 @@
+"""Columnar, memory-mapped archive of priced orders.
+
+The file is a header followed by fixed-size blocks. Each block holds
+`block_rows` orders column by column::
+
+    price cents  int64[rows]
+    counts       uint16[rows, len(CONDIMENTS)]
+    base codes   uint8[rows]
+    size codes   uint8[rows]
+
+Readers map the file and get NumPy views straight onto those columns, so
+nothing is parsed or copied. Appends write the column data first and only then
+bump the row count in the header.
+"""
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from starbuzz_batch import current_tables, encode_beverages, price_batch
+from starbuzz_with_sizes import (
+    CENTS_PRICING,
+    CONDIMENTS,
+    SIZE_CONVERTER,
+    Beverage,
+    CentsPricing,
+    Size,
+    set_pricing,
+)
+
+MAGIC = b"SBZA"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIQ")
+HEADER_SIZE = 64
+
+
+class OrderArchive:
+    """Append-only columnar store of (base, size, counts, price cents)."""
+
+    def __init__(self, path, block_rows=65536) -> None:
+        if block_rows % 8:
+            raise ValueError("block_rows must be a multiple of 8.")
+        self.path = path
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, "wb") as file:
+                file.write(self._header(block_rows, 0))
+        with open(path, "rb") as file:
+            magic, version, condiments, block_rows, _ = HEADER.unpack(
+                file.read(HEADER.size)
+            )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not an order archive.")
+        if condiments != len(CONDIMENTS):
+            raise ValueError(f"{path} has {condiments} condiment columns.")
+        self.block_rows = block_rows
+        self.block_size = block_rows * (8 + 2 * len(CONDIMENTS) + 2)
+        self._mapped = None
+
+    @staticmethod
+    def _header(block_rows, rows):
+        header = HEADER.pack(MAGIC, VERSION, len(CONDIMENTS), block_rows, rows)
+        return header.ljust(HEADER_SIZE, b"\0")
+
+    def __len__(self) -> int:
+        with open(self.path, "rb") as file:
+            return HEADER.unpack(file.read(HEADER.size))[4]
+
+    def _offsets(self, block):
+        start = HEADER_SIZE + block * self.block_size
+        rows = self.block_rows
+        counts = start + 8 * rows
+        bases = counts + 2 * len(CONDIMENTS) * rows
+        return start, counts, bases, bases + rows
+
+    def append(self, bases, sizes, counts, cents):
+        """Append orders given as columns."""
+        cents = np.asarray(cents, dtype="<i8")
+        counts = np.asarray(counts, dtype="<u2").reshape(len(cents), len(CONDIMENTS))
+        bases = np.asarray(bases, dtype="u1")
+        sizes = np.asarray(sizes, dtype="u1")
+        rows = len(self)
+        written = 0
+        with open(self.path, "r+b") as file:
+            while written < len(cents):
+                block, row = divmod(rows + written, self.block_rows)
+                take = min(self.block_rows - row, len(cents) - written)
+                chunk = slice(written, written + take)
+                price_at, counts_at, bases_at, sizes_at = self._offsets(block)
+                if row == 0:
+                    file.truncate(price_at + self.block_size)
+                width = 2 * len(CONDIMENTS)
+                for offset, column in (
+                    (price_at + 8 * row, cents[chunk]),
+                    (counts_at + width * row, counts[chunk]),
+                    (bases_at + row, bases[chunk]),
+                    (sizes_at + row, sizes[chunk]),
+                ):
+                    file.seek(offset)
+                    file.write(column.tobytes())
+                written += take
+            file.flush()
+            os.fsync(file.fileno())
+            file.seek(0)
+            file.write(self._header(self.block_rows, rows + written))
+
+    def append_drinks(self, drinks):
+        """Encode, price with the live cents menu and append decorated drinks."""
+        tables = current_tables()
+        if not tables.exact:
+            raise ValueError("The archive stores cents; select cents pricing first.")
+        bases, sizes, counts = encode_beverages(drinks)
+        self.append(bases, sizes, counts, price_batch(bases, sizes, counts, tables))
+
+    def _map(self):
+        size = os.path.getsize(self.path)
+        if self._mapped is None or len(self._mapped) != size:
+            with open(self.path, "rb") as file:
+                self._mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mapped
+
+    def scan(self, start=0, stop=None):
+        """Yield zero-copy column views covering rows [start, stop).
+
+        Each item is a dict of NumPy arrays named cents, counts, bases and
+        sizes, one per block touched.
+        """
+        total = len(self)
+        stop = total if stop is None else min(stop, total)
+        mapped = self._map()
+        row = start
+        while row < stop:
+            block, first = divmod(row, self.block_rows)
+            take = min(self.block_rows - first, stop - row)
+            price_at, counts_at, bases_at, sizes_at = self._offsets(block)
+            width = len(CONDIMENTS)
+            yield {
+                "cents": np.frombuffer(mapped, "<i8", take, price_at + 8 * first),
+                "counts": np.frombuffer(
+                    mapped, "<u2", take * width, counts_at + 2 * width * first
+                ).reshape(take, width),
+                "bases": np.frombuffer(mapped, "u1", take, bases_at + first),
+                "sizes": np.frombuffer(mapped, "u1", take, sizes_at + first),
+            }
+            row += take
+
+    def revenue(self, start=0, stop=None):
+        """Total price cents over a row range."""
+        return sum(int(block["cents"].sum()) for block in self.scan(start, stop))
+
+    def revenue_by_size(self, start=0, stop=None):
+        """Price cents per Size over a row range."""
+        totals = [0] * len(Size)
+        for block in self.scan(start, stop):
+            for code in range(len(Size)):
+                totals[code] += int(block["cents"][block["sizes"] == code].sum())
+        return {size: totals[SIZE_CONVERTER[size]] for size in Size}
+
+    def revenue_by_condiment(self, start=0, stop=None, pricing=None):
+        """Cents earned by each condiment at the given pricing's unit prices.
+
+        By default that is the live menu, which must be priced in cents.
+        """
+        pricing = pricing or Beverage.pricing
+        if not isinstance(pricing, CentsPricing):
+            raise ValueError("Condiment revenue needs a cents pricing backend.")
+        components = np.array(
+            [pricing.components(condiment) for condiment in CONDIMENTS],
+            dtype=np.int64,
+        )
+        totals = np.zeros(len(CONDIMENTS), dtype=np.int64)
+        for block in self.scan(start, stop):
+            units = block["counts"].astype(np.int64)
+            unit_prices = components[:, 0] + np.outer(block["sizes"], components[:, 1])
+            totals += (units * unit_prices).sum(axis=0)
+        return {condiment: int(total) for condiment, total in zip(CONDIMENTS, totals)}
+
+    def close(self):
+        """Unmap the file; fails while views from scan() are still alive."""
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    from starbuzz_bench import random_drinks
+
+    set_pricing(CENTS_PRICING)
+    with tempfile.TemporaryDirectory() as directory:
+        archive = OrderArchive(os.path.join(directory, "orders.sbza"), block_rows=4096)
+        drinks = random_drinks(10_000)
+        archive.append_drinks(drinks[:6000])
+        archive.append_drinks(drinks[6000:])
+        print(f"{len(archive)} orders, {CENTS_PRICING.format(archive.revenue())}")
+        for size, cents in archive.revenue_by_size().items():
+            print(f"  {size.value}: {CENTS_PRICING.format(cents)}")
+        for condiment, cents in archive.revenue_by_condiment().items():
+            print(f"  {condiment.__name__}: {CENTS_PRICING.format(cents)}")
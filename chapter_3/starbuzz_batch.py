@@ -0,0 +1,121 @@
+"""Vectorized pricing for batches of sized Starbuzz orders.
+
+An order is encoded as three columns: a base code indexing BEVERAGES, a size
+code from SIZE_CONVERTER and a row of condiment counts lining up with
+CONDIMENTS.
+"""
+import numpy as np
+
+from starbuzz_with_sizes import (
+    BEVERAGES,
+    CENTS_PRICING,
+    CONDIMENTS,
+    FLOAT_PRICING,
+    SIZE_CONVERTER,
+    Beverage,
+    CentsPricing,
+    Size,
+    compile_beverage,
+)
+
+BEVERAGE_CODES = {beverage: code for code, beverage in enumerate(BEVERAGES)}
+
+
+class PriceTables:
+    """Base prices and per-size steps for every beverage and condiment.
+
+    Tables built for CENTS_PRICING hold int64 cents and price exactly;
+    FLOAT_PRICING tables hold float64 dollars.
+    """
+
+    def __init__(
+        self, pricing=FLOAT_PRICING, beverages=BEVERAGES, condiments=CONDIMENTS
+    ) -> None:
+        self.exact = isinstance(pricing, CentsPricing)
+        dtype = np.int64 if self.exact else np.float64
+        base = np.array([pricing.components(b) for b in beverages], dtype=dtype)
+        condiment = np.array([pricing.components(c) for c in condiments], dtype=dtype)
+        self.base_price, self.base_step = base[:, 0], base[:, 1]
+        self.condiment_price = condiment[:, 0]
+        self.condiment_step = condiment[:, 1]
+
+
+DEFAULT_TABLES = PriceTables()
+CENTS_TABLES = PriceTables(CENTS_PRICING)
+_current = (FLOAT_PRICING, DEFAULT_TABLES)
+
+
+def current_tables():
+    """Return price tables for the live pricing backend.
+
+    Tables are rebuilt only when Beverage.pricing changes, e.g. on a menu
+    reload, and swapped in as one (pricing, tables) pair.
+    """
+    global _current
+    pricing = Beverage.pricing
+    cached_pricing, tables = _current
+    if cached_pricing is not pricing:
+        tables = PriceTables(pricing)
+        _current = (pricing, tables)
+    return tables
+
+
+def encode_beverage(beverage):
+    """Return the (base code, size code, condiment counts) of a drink."""
+    compiled = compile_beverage(beverage)
+    return (
+        BEVERAGE_CODES[compiled.base],
+        SIZE_CONVERTER[compiled.size],
+        compiled.counts,
+    )
+
+
+def encode_beverages(beverages):
+    """Encode drinks into the column arrays price_batch() expects."""
+    encoded = [encode_beverage(beverage) for beverage in beverages]
+    bases = np.array([row[0] for row in encoded], dtype=np.intp)
+    sizes = np.array([row[1] for row in encoded], dtype=np.intp)
+    counts = np.array([row[2] for row in encoded], dtype=np.int64).reshape(
+        len(encoded), len(CONDIMENTS)
+    )
+    return bases, sizes, counts
+
+
+def price_batch(bases, sizes, counts, tables=None):
+    """Price every order in one pass, by default with the live menu.
+
+    Float tables are rounded to the cent like Beverage.cost(); cents
+    tables return exact int64 cents.
+    """
+    tables = tables or current_tables()
+    dtype = tables.base_price.dtype
+    bases = np.asarray(bases, dtype=np.intp)
+    sizes = np.asarray(sizes, dtype=dtype)
+    counts = np.asarray(counts, dtype=dtype)
+    prices = tables.base_price[bases] + tables.base_step[bases] * sizes
+    prices += counts @ tables.condiment_price
+    prices += (counts @ tables.condiment_step) * sizes
+    return prices if tables.exact else np.round(prices, 2)
+
+
+if __name__ == "__main__":
+    from starbuzz_with_sizes import DarkRoast, Espresso, HouseBlend, Milk, Mocha, Whip
+
+    drinks = [
+        Whip(Mocha(HouseBlend(Size.venti))),
+        Milk(DarkRoast(Size.tall)),
+        Whip(Whip(Whip(Espresso(Size.grande)))),
+    ]
+    # 2.84, 1.0, 2.9
+    print(price_batch(*encode_beverages(drinks)))
+    # 284, 100, 290
+    print(price_batch(*encode_beverages(drinks), tables=CENTS_TABLES))
+
+    rng = np.random.default_rng(0)
+    n = 1_000_000
+    prices = price_batch(
+        rng.integers(len(BEVERAGES), size=n),
+        rng.integers(len(Size), size=n),
+        rng.integers(3, size=(n, len(CONDIMENTS))),
+    )
+    print(f"{n} orders, revenue {prices.sum():.2f}")
@@ -0,0 +1,434 @@
+"""Benchmarks for the Starbuzz implementations and pricing paths.
+
+``python starbuzz_bench.py suite --json results.json`` runs the comparison of
+the three decorator modules. Add ``--baseline old.json`` to exit non-zero when
+any figure is more than ``--threshold`` worse than the baseline. Suite figures
+are medians over several passes, each in a fresh interpreter.
+"""
+import argparse
+import concurrent.futures
+import importlib
+import json
+import math
+import multiprocessing
+import random
+import statistics
+import sys
+import timeit
+import tracemalloc
+
+import numpy as np
+
+import starbuzz_batch
+import starbuzz_promotions
+import starbuzz_with_sizes as sized
+from starbuzz_with_sizes import (
+    BEVERAGES,
+    CENTS_PRICING,
+    CONDIMENTS,
+    FLOAT_PRICING,
+    Size,
+    compile_beverage,
+    set_pricing,
+)
+
+
+def random_drinks(count, max_condiments=3, seed=0):
+    """Build a reproducible mix of decorated drinks."""
+    rng = random.Random(seed)
+    drinks = []
+    for _ in range(count):
+        drink = rng.choice(BEVERAGES)(rng.choice(list(Size)))
+        for _ in range(rng.randint(0, max_condiments)):
+            drink = rng.choice(CONDIMENTS)(drink)
+        drinks.append(drink)
+    return drinks
+
+
+def total_cost(drinks):
+    # Compiled drinks are priced fresh each call; decorator chains would only
+    # hit their memo after the first round.
+    compiled = [compile_beverage(drink) for drink in drinks]
+    return sum(drink.cost() for drink in compiled)
+
+
+def bench_pricing(count=100_000, repeat=5):
+    """Time float dollars against integer cents, per object and batched."""
+    drinks = random_drinks(count)
+    columns = starbuzz_batch.encode_beverages(drinks)
+    results = {}
+    for name, pricing, tables in (
+        ("float", FLOAT_PRICING, starbuzz_batch.DEFAULT_TABLES),
+        ("cents", CENTS_PRICING, starbuzz_batch.CENTS_TABLES),
+    ):
+        set_pricing(pricing)
+        batched = starbuzz_batch.price_batch(*columns, tables=tables).tolist()
+        if batched != [drink.cost() for drink in drinks]:
+            raise RuntimeError(f"{name} batch prices differ from the drinks' costs.")
+        per_object = min(
+            timeit.repeat(lambda: total_cost(drinks), number=1, repeat=repeat)
+        )
+        batch = min(
+            timeit.repeat(
+                lambda: starbuzz_batch.price_batch(*columns, tables=tables).sum(),
+                number=1,
+                repeat=repeat,
+            )
+        )
+        results[name] = {
+            "total": pricing.format(total_cost(drinks)),
+            "per_object_s": per_object,
+            "batch_s": batch,
+        }
+    set_pricing(FLOAT_PRICING)
+    return results
+
+
+def float_drift(count=1_000_000):
+    """Show how far an unrounded float running total drifts from exact cents."""
+    prices = starbuzz_batch.price_batch(
+        *starbuzz_batch.encode_beverages(random_drinks(1000)),
+        tables=starbuzz_batch.CENTS_TABLES,
+    )
+    cents = np.resize(prices, count)
+    running = 0.0
+    for price in (cents / 100).tolist():
+        running += price
+    return running, CENTS_PRICING.format(int(cents.sum()))
+
+
+def build_order(module, depth):
+    """Build HouseBlend wrapped in `depth` condiments from one starbuzz module."""
+    args = (module.Size.venti,) if hasattr(module, "Size") else ()
+    drink = module.HouseBlend(*args)
+    for layer in range(depth):
+        drink = (module.Milk, module.Mocha, module.Soy, module.Whip)[layer % 4](drink)
+    return drink
+
+
+def bytes_per_order(build, count=10_000):
+    """Average bytes allocated by `build()`, keeping every result alive."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        orders = [build() for _ in range(count)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    # Exclude the list holding the orders.
+    return (after - before) / len(orders) - 8
+
+
+MODULES = ("starbuzz", "starbuzz_their_way", "starbuzz_with_sizes")
+
+
+class DictDrink:
+    """A sized drink laid out as before __slots__, with a per-instance dict."""
+
+    def __init__(self, size):
+        self.size = size
+
+
+class DictCondiment(DictDrink):
+    """A condiment laid out as before __slots__, with its own memo dict."""
+
+    def __init__(self, beverage):
+        self._beverage = beverage
+        self._memo = {}
+        self.size = beverage.size
+
+
+def build_dict_order(depth):
+    """build_order() for the __dict__ reference layout."""
+    drink = DictDrink(Size.venti)
+    for _ in range(depth):
+        drink = DictCondiment(drink)
+    return drink
+
+
+def bench_memory(modules=MODULES, count=10_000):
+    """Bytes per order for chain depths 1 to 10 in each module.
+
+    The "__dict__" column is the sized chain laid out as it was before
+    __slots__, as a reference for the starbuzz_with_sizes figures.
+    """
+    results = {}
+    for name in modules:
+        module = importlib.import_module(name)
+        results[name] = {
+            depth: bytes_per_order(lambda: build_order(module, depth), count)
+            for depth in range(1, 11)
+        }
+    results["__dict__"] = {
+        depth: bytes_per_order(lambda: build_dict_order(depth), count)
+        for depth in range(1, 11)
+    }
+    results["compiled"] = {
+        depth: bytes_per_order(
+            lambda: compile_beverage(build_order(sized, depth)), count
+        )
+        for depth in range(1, 11)
+    }
+    return results
+
+
+def random_promotions(count, seed=0):
+    """Build `count` random promotions over the whole menu."""
+    rng = random.Random(seed)
+    promotions = []
+    for number in range(count):
+        promotions.append(
+            starbuzz_promotions.Promotion(
+                f"promo {number}",
+                rng.randint(5, 30),
+                base=rng.choice(BEVERAGES + (None,)),
+                size=rng.choice(list(Size) + [None]),
+                condiments=rng.sample(CONDIMENTS, rng.randint(0, 2)),
+            )
+        )
+    return promotions
+
+
+def bench_promotions(rule_counts=(10, 100, 1000, 10_000), orders=500):
+    """Seconds to find the best promotion per order, linear scan vs index."""
+    drinks = [compile_beverage(drink) for drink in random_drinks(orders)]
+    results = {}
+    for count in rule_counts:
+        promotions = random_promotions(count)
+        index = starbuzz_promotions.PromotionIndex(promotions)
+
+        def linear():
+            for drink in drinks:
+                max(
+                    (p.percent for p in promotions if p.matches(drink)), default=0
+                )
+
+        def indexed():
+            for drink in drinks:
+                index.best(drink)
+
+        results[count] = {
+            "linear_s": min(timeit.repeat(linear, number=1, repeat=3)) / orders,
+            "indexed_s": min(timeit.repeat(indexed, number=1, repeat=3)) / orders,
+        }
+    return results
+
+
+def order_mix(module, count, seed=0):
+    """Return a function building a realistic mix of orders from a module.
+
+    Most orders carry zero to two condiments and a few carry up to five.
+    """
+    rng = random.Random(seed)
+    bases = (module.HouseBlend, module.DarkRoast, module.Espresso, module.Decaf)
+    condiments = (module.Milk, module.Mocha, module.Soy, module.Whip)
+    sizes = list(module.Size) if hasattr(module, "Size") else None
+    specs = []
+    for _ in range(count):
+        args = (rng.choice(sizes),) if sizes else ()
+        depth = rng.choices(range(6), weights=(30, 35, 20, 8, 5, 2))[0]
+        specs.append((rng.choice(bases), args, rng.choices(condiments, k=depth)))
+
+    def build():
+        orders = []
+        for base, args, layers in specs:
+            drink = base(*args)
+            for condiment in layers:
+                drink = condiment(drink)
+            orders.append(drink)
+        return orders
+
+    return build
+
+
+# Each timing sample runs for at least this long, so that timer resolution and
+# scheduler noise stay small next to the figure being measured.
+SAMPLE_S = 0.02
+
+
+def per_call(function, count, repeat=3):
+    """Best-of-`repeat` seconds per call when `function` does `count` calls."""
+    timer = timeit.Timer(function)
+    number = math.ceil(SAMPLE_S / max(timer.timeit(1), 1e-9))
+    return min(timer.repeat(repeat, number)) / (number * count)
+
+
+def per_fresh_call(statement, fresh, count, repeat=3):
+    """Best-of-`repeat` seconds per drink for `statement` over new drinks.
+
+    `statement` runs over ``drinks``, a list of `count` drinks from `fresh()`.
+    Every round gets its own list, so memoized results are never reused.
+    """
+    once = timeit.timeit(
+        statement, setup="drinks = fresh()", globals={"fresh": fresh}, number=1
+    )
+    rounds = math.ceil(SAMPLE_S / max(once, 1e-9))
+    return min(
+        timeit.repeat(
+            f"for drinks in batches:\n    {statement}",
+            setup="batches = [fresh() for _ in range(rounds)]",
+            globals={"fresh": fresh, "rounds": rounds},
+            number=1,
+            repeat=repeat,
+        )
+    ) / (rounds * count)
+
+
+def bench_module(name, depths=(1, 2, 4, 8, 16, 32), count=2_000):
+    """Latency, construction, memory and throughput figures for one module."""
+    module = importlib.import_module(name)
+    results = {"cost_s": {}, "description_s": {}, "cached_cost_s": {}}
+    for depth in depths:
+
+        def fresh():
+            return [build_order(module, depth) for _ in range(count)]
+
+        results["cost_s"][depth] = per_fresh_call(
+            "for d in drinks: d.cost()", fresh, count
+        )
+        results["description_s"][depth] = per_fresh_call(
+            "for d in drinks: d.get_description()", fresh, count
+        )
+        drinks = fresh()
+        results["cached_cost_s"][depth] = per_call(
+            lambda: [drink.cost() for drink in drinks], count
+        )
+    build = order_mix(module, count)
+    results["construct_s"] = per_call(build, count)
+
+    def settle():
+        for drink in build():
+            drink.cost()
+            drink.get_description()
+
+    results["mix_orders_per_s"] = 1 / per_call(settle, count)
+    results["memory_bytes"] = {
+        depth: bytes_per_order(lambda: build_order(module, depth))
+        for depth in depths
+    }
+    return results
+
+
+def median_of(runs):
+    """Merge repeated results, keeping the median of each figure."""
+    if isinstance(runs[0], dict):
+        return {key: median_of([run[key] for run in runs]) for key in runs[0]}
+    return statistics.median(runs)
+
+
+def bench_pass(modules):
+    # JSON keys are strings, so round-trip before comparing with a baseline.
+    return json.loads(json.dumps({name: bench_module(name) for name in modules}))
+
+
+def bench_suite(modules=MODULES, passes=5):
+    """Run every module's benchmarks `passes` times and keep the median figures.
+
+    Each pass runs in a freshly spawned interpreter: on a shared machine one
+    process can run tens of percent faster or slower than the next for its
+    whole life, so no single process gives figures a later run can repeat.
+    """
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(
+        1, mp_context=context, max_tasks_per_child=1
+    ) as pool:
+        return median_of(list(pool.map(bench_pass, [modules] * passes)))
+
+
+def flatten(results, prefix=""):
+    """Flatten nested results into {"module.metric.depth": value}."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def regressions(results, baseline, threshold):
+    """Figures more than `threshold` worse than the baseline.
+
+    Throughput (``_per_s``) regresses when it drops; times and byte counts
+    regress when they grow.
+    """
+    current = flatten(results)
+    worse = []
+    for name, old in flatten(baseline).items():
+        new = current.get(name)
+        if new is None or not old:
+            continue
+        higher_is_better = "_per_s" in name
+        change = (old - new) / old if higher_is_better else (new - old) / old
+        if change > threshold:
+            worse.append((name, old, new, change))
+    return worse
+
+
+def run_suite(args):
+    results = bench_suite()
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        worse = regressions(results, baseline, args.threshold)
+        for name, old, new, change in worse:
+            print(f"REGRESSION {name}: {old:.4g} -> {new:.4g} ({change:+.0%})")
+        return 1 if worse else 0
+    return 0
+
+
+def print_pricing():
+    for name, result in bench_pricing().items():
+        print(
+            f"{name}: total {result['total']}, "
+            f"per object {result['per_object_s']:.3f}s, "
+            f"batch {result['batch_s'] * 1000:.1f}ms"
+        )
+    running, exact = float_drift()
+    print(f"float running total {running!r} vs exact {exact}")
+
+
+def print_memory():
+    results = bench_memory()
+    print("depth " + "".join(f"{name:>22}" for name in results))
+    for depth in range(1, 11):
+        row = "".join(f"{results[name][depth]:>22.0f}" for name in results)
+        print(f"{depth:>5} {row}")
+
+
+def print_promotions():
+    print("rules   linear/order  indexed/order")
+    for count, result in bench_promotions().items():
+        print(
+            f"{count:>5} {result['linear_s'] * 1e6:>10.1f}us "
+            f"{result['indexed_s'] * 1e6:>12.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    benches = {
+        "pricing": print_pricing,
+        "memory": print_memory,
+        "promotions": print_promotions,
+    }
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("bench", choices=["suite", *benches])
+    parser.add_argument("--json", help="write suite results to this file")
+    parser.add_argument("--baseline", help="suite results to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="allowed slowdown against the baseline, as a fraction",
+    )
+    args = parser.parse_args()
+    if args.bench == "suite":
+        sys.exit(run_suite(args))
+    benches[args.bench]()
@@ -0,0 +1,125 @@
+"""Shared, cached drinks keyed by an order-insensitive signature.
+
+Most orders are one of a few popular combinations. A drink's signature is its
+(base, size, condiment counts), so ``Whip(Mocha(x))`` and ``Mocha(Whip(x))``
+share one entry, one SharedDrink instance and one priced result.
+"""
+import collections
+
+from starbuzz_with_sizes import (
+    CONDIMENT_INDEX,
+    CONDIMENTS,
+    Beverage,
+    CompiledBeverage,
+    Size,
+    compile_beverage,
+)
+
+CacheInfo = collections.namedtuple(
+    "CacheInfo", ["hits", "misses", "evictions", "maxsize", "currsize"]
+)
+
+
+def signature(beverage):
+    """Return the canonical (base, size, counts) key of any drink."""
+    if not isinstance(beverage, CompiledBeverage):
+        beverage = compile_beverage(beverage)
+    return beverage.base, beverage.size, beverage.counts
+
+
+class SharedDrink(CompiledBeverage):
+    """An immutable compiled drink handed out for every repeat signature.
+
+    Condiments are listed in CONDIMENTS order, so the description is the same
+    however the original chain was stacked. The cost is kept for the live
+    pricing backend.
+    """
+
+    def __init__(self, base, size: Size, counts) -> None:
+        runs = tuple((c, n) for c, n in zip(CONDIMENTS, counts) if n)
+        super().__init__(base, size, counts, runs)
+        self._description = super().get_description()
+        self._costs = {}
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError("Shared drinks are immutable.")
+        super().__setattr__(name, value)
+
+    def get_description(self):
+        return self._description
+
+    def cost(self):
+        pricing = Beverage.pricing
+        cost = self._costs.get(pricing)
+        if cost is None:
+            cost = pricing.total(amount for _, amount in self.itemized(pricing))
+            # Only the live backend is worth keeping once menus get reloaded.
+            self._costs.clear()
+            self._costs[pricing] = cost
+        return cost
+
+
+class DrinkCache:
+    """Bounded LRU from signature to its SharedDrink."""
+
+    def __init__(self, maxsize=1024) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._drinks = collections.OrderedDict()
+
+    def get(self, key) -> SharedDrink:
+        drink = self._drinks.get(key)
+        if drink is not None:
+            self.hits += 1
+            self._drinks.move_to_end(key)
+            return drink
+        self.misses += 1
+        drink = self._drinks[key] = SharedDrink(*key)
+        if len(self._drinks) > self.maxsize:
+            self._drinks.popitem(last=False)
+            self.evictions += 1
+        return drink
+
+    def drink(self, base, size: Size, *condiments) -> SharedDrink:
+        """Return the shared drink for a base, size and condiments."""
+        counts = [0] * len(CONDIMENTS)
+        for condiment in condiments:
+            counts[CONDIMENT_INDEX[condiment]] += 1
+        return self.get((base, size, tuple(counts)))
+
+    def lookup(self, beverage) -> SharedDrink:
+        """Return the shared drink matching a decorated or compiled drink."""
+        return self.get(signature(beverage))
+
+    def price(self, beverage):
+        """Return (cost, description) for a drink through the cache."""
+        drink = self.lookup(beverage)
+        return drink.cost(), drink.get_description()
+
+    def cache_info(self):
+        return CacheInfo(
+            self.hits, self.misses, self.evictions, self.maxsize, len(self._drinks)
+        )
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self):
+        self._drinks.clear()
+        self.hits = self.misses = self.evictions = 0
+
+
+if __name__ == "__main__":
+    from starbuzz_with_sizes import HouseBlend, Mocha, Whip
+
+    cache = DrinkCache(maxsize=64)
+    first = cache.lookup(Whip(Mocha(HouseBlend(Size.venti))))
+    second = cache.drink(HouseBlend, Size.venti, Whip, Mocha)
+    # Same signature, same shared instance: 2.84
+    print(first is second, first.cost(), first.get_description())
+    print(cache.cache_info(), f"hit rate {cache.hit_rate():.0%}")
@@ -0,0 +1,176 @@
+"""Menu prices loaded from a file and hot-reloaded into the pricing backend.
+
+A menu file maps menu item names to their price and size step, as JSON::
+
+    {"HouseBlend": {"price": 1.10, "size_step": 0.10}, ...}
+
+or the same in TOML. Items left out keep the prices written on their classes.
+"""
+import json
+import math
+import os
+import threading
+import tomllib
+
+from starbuzz_with_sizes import (
+    BEVERAGES,
+    CONDIMENTS,
+    SIZE_CONVERTER,
+    CentsPricing,
+    FloatPricing,
+    Size,
+    set_pricing,
+)
+
+MENU_ITEMS = BEVERAGES + CONDIMENTS
+MENU_FIELDS = ("price", "size_step")
+
+
+class MenuTables:
+    """One immutable version of the menu, compiled into lookup tables.
+
+    `components` holds (price, size step) per item and `prices` the price of
+    every item at every size, indexed by SIZE_CONVERTER.
+    """
+
+    def __init__(self, components, version=0) -> None:
+        self.version = version
+        self._components = dict(components)
+        self._prices = {
+            item: tuple(price + size_step * step for step in range(len(Size)))
+            for item, (price, size_step) in self._components.items()
+        }
+
+    def components(self, item):
+        return self._components[item]
+
+    def price(self, item, size: Size):
+        return self._prices[item][SIZE_CONVERTER[size]]
+
+
+class FloatMenu(MenuTables, FloatPricing):
+    """A menu snapshot priced in float dollars."""
+
+
+class CentsMenu(MenuTables, CentsPricing):
+    """A menu snapshot priced in exact integer cents."""
+
+
+def read_menu(path):
+    """Return {item class: (price, size step)} from a JSON or TOML file."""
+    with open(path, "rb") as file:
+        if os.fspath(path).endswith(".toml"):
+            entries = tomllib.load(file)
+        else:
+            entries = json.load(file)
+    if not isinstance(entries, dict):
+        raise ValueError("A menu must map item names to their prices.")
+    by_name = {item.__name__: item for item in MENU_ITEMS}
+    unknown = set(entries) - set(by_name)
+    if unknown:
+        raise ValueError(f"Unknown menu items: {', '.join(sorted(unknown))}")
+    components = {item: (item.price, item.size_step) for item in MENU_ITEMS}
+    for name, entry in entries.items():
+        check_entry(name, entry)
+        item = by_name[name]
+        components[item] = (
+            entry.get("price", item.price),
+            entry.get("size_step", item.size_step),
+        )
+    return components
+
+
+def check_entry(name, entry):
+    """Raise ValueError unless `entry` is a table of non-negative prices."""
+    if not isinstance(entry, dict):
+        raise ValueError(f"{name}: expected a table of prices, got {entry!r}")
+    unknown = set(entry) - set(MENU_FIELDS)
+    if unknown:
+        raise ValueError(f"{name}: unknown fields {', '.join(sorted(unknown))}")
+    for field, value in entry.items():
+        # bool is an int subclass, but true is no price.
+        if (
+            isinstance(value, bool)
+            or not isinstance(value, (int, float))
+            or not math.isfinite(value)
+            or value < 0
+        ):
+            raise ValueError(f"{name}: {field} must be a non-negative number")
+
+
+def load_menu(path, exact=False, version=0):
+    """Compile a menu file into a FloatMenu, or a CentsMenu when exact."""
+    components = read_menu(path)
+    if exact:
+        components = {
+            item: (round(price * 100), round(size_step * 100))
+            for item, (price, size_step) in components.items()
+        }
+        return CentsMenu(components, version)
+    return FloatMenu(components, version)
+
+
+class MenuReloader:
+    """Keeps Beverage.pricing in step with a menu file.
+
+    A reload compiles a complete new snapshot before installing it with
+    set_pricing(), so pricing never waits on a reload or sees half a menu.
+    """
+
+    def __init__(self, path, exact=False) -> None:
+        self.path = path
+        self.exact = exact
+        self.menu = None
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def reload(self):
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime_ns
+            version = self.menu.version + 1 if self.menu else 0
+            menu = load_menu(self.path, self.exact, version)
+            self.menu, self._mtime = menu, mtime
+            set_pricing(menu)
+            return menu
+
+    def reload_if_changed(self):
+        """Reload when the file changed; return whether it did."""
+        if os.stat(self.path).st_mtime_ns == self._mtime:
+            return False
+        self.reload()
+        return True
+
+    def watch(self, interval=1.0):
+        """Poll the menu file from a daemon thread."""
+        self.reload()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._poll, args=(interval,), daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _poll(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.reload_if_changed()
+            except (OSError, ValueError):
+                # Keep serving the last good menu until the file is fixed.
+                pass
+
+
+if __name__ == "__main__":
+    from starbuzz_with_sizes import HouseBlend, Mocha, Whip
+
+    reloader = MenuReloader(os.path.join(os.path.dirname(__file__), "menu.json"))
+    reloader.reload()
+    drink = Whip(Mocha(HouseBlend(Size.venti)))
+    # 1.30 + 1.29 + 0.25 = 2.84
+    print(drink.cost(), f"menu version {reloader.menu.version}")
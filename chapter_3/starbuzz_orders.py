@@ -0,0 +1,230 @@
+"""Price a Starbuzz order log in a single streaming pass.
+
+Each line holds one order: a size, a base beverage and its condiments from the
+innermost out, e.g. ``VENTI HouseBlend Mocha Whip``. Blank lines and lines
+starting with ``#`` are skipped.
+"""
+import argparse
+import collections
+import concurrent.futures
+import functools
+import mmap
+import os
+import sys
+import time
+
+from starbuzz_menu import load_menu
+from starbuzz_with_sizes import (
+    BEVERAGES,
+    CENTS_PRICING,
+    CONDIMENT_INDEX,
+    CONDIMENTS,
+    Beverage,
+    CompiledBeverage,
+    Size,
+    set_pricing,
+)
+
+MENU = {item.__name__: item for item in BEVERAGES + CONDIMENTS}
+
+
+def read_lines(path, start=0, end=None):
+    """Yield the raw lines of a file through a read-only memory map.
+
+    With a byte range, yields the lines that start inside [start, end).
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            end = len(mapped) if end is None else end
+            mapped.seek(start)
+            while mapped.tell() < end:
+                line = mapped.readline()
+                if not line:
+                    return
+                yield line
+
+
+def chunk_ranges(path, chunks):
+    """Split a file into byte ranges that each start at the top of a line."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    bounds = [0]
+    with open(path, "rb") as file:
+        for index in range(1, chunks):
+            file.seek(max(size * index // chunks, bounds[-1]))
+            if file.tell() > 0:
+                file.seek(file.tell() - 1)
+                file.readline()
+            if file.tell() < size and file.tell() > bounds[-1]:
+                bounds.append(file.tell())
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_order(line: bytes) -> CompiledBeverage:
+    """Build the compiled drink for one order line.
+
+    Popular orders repeat constantly, so parsed lines are kept in a small LRU
+    cache instead of rebuilding the same drink every time.
+    """
+    size, base, *condiments = line.decode("ascii").split()
+    if MENU[base] not in BEVERAGES:
+        raise KeyError(base)
+    counts = [0] * len(CONDIMENTS)
+    runs = []
+    for name in condiments:
+        condiment = MENU[name]
+        counts[CONDIMENT_INDEX[condiment]] += 1
+        if runs and runs[-1][0] is condiment:
+            runs[-1] = (condiment, runs[-1][1] + 1)
+        else:
+            runs.append((condiment, 1))
+    return CompiledBeverage(MENU[base], Size(size), tuple(counts), tuple(runs))
+
+
+class OrderError(ValueError):
+    """An order line that doesn't name a size and items on the menu."""
+
+
+def parse_orders(lines, start=0):
+    """Yield a compiled drink for every order line.
+
+    `start` is the byte offset of the first line, used to say where a bad
+    line is.
+    """
+    offset = start
+    for raw in lines:
+        line = raw.strip()
+        if line and not line.startswith(b"#"):
+            try:
+                yield parse_order(line)
+            except (KeyError, ValueError) as error:
+                raise OrderError(f"bad order {line!r} at byte {offset}") from error
+        offset += len(raw)
+
+
+class Settlement:
+    """Running totals for a stream of priced orders.
+
+    Only whole units sold per (menu item, size) are accumulated. Revenue is
+    derived from those counts in a fixed order, so settlements merged from any
+    number of chunks come out exactly equal to a single pass over the file.
+    """
+
+    def __init__(self) -> None:
+        self.orders = 0
+        self.units = collections.Counter()
+
+    def add(self, order: CompiledBeverage):
+        self.orders += 1
+        self.units[order.base.__name__, order.size.value] += 1
+        for condiment, count in zip(CONDIMENTS, order.counts):
+            if count:
+                self.units[condiment.__name__, order.size.value] += count
+
+    def merge(self, other: "Settlement"):
+        self.orders += other.orders
+        self.units.update(other.units)
+
+    def revenue_by(self):
+        """Return revenue per menu item and per size."""
+        by_item = collections.Counter()
+        by_size = collections.Counter()
+        pricing = Beverage.pricing
+        for (name, size), units in sorted(self.units.items()):
+            amount = units * pricing.price(MENU[name], Size(size))
+            by_item[name] += amount
+            by_size[size] += amount
+        return by_item, by_size
+
+    @property
+    def revenue(self):
+        by_item, _ = self.revenue_by()
+        return sum(amount for _, amount in sorted(by_item.items()))
+
+    def report(self, file=sys.stdout):
+        by_item, by_size = self.revenue_by()
+        money = Beverage.pricing.format
+        revenue = sum(amount for _, amount in sorted(by_item.items()))
+        print(f"orders: {self.orders}", file=file)
+        print(f"revenue: {money(revenue)}", file=file)
+        for name, amount in sorted(by_size.items()):
+            print(f"  {name}: {money(amount)}", file=file)
+        for name, amount in sorted(by_item.items()):
+            print(f"  {name}: {money(amount)}", file=file)
+
+
+def settle_range(path, start=0, end=None):
+    """Settle the orders whose lines start inside a byte range.
+
+    Only unit counts cross the process boundary, so the worker's pricing
+    backend does not matter.
+    """
+    settlement = Settlement()
+    for order in parse_orders(read_lines(path, start, end), start):
+        settlement.add(order)
+    return settlement
+
+
+def settle(path, progress=0):
+    """Price every order in the file, printing running totals if asked."""
+    settlement = Settlement()
+    start = time.perf_counter()
+    for order in parse_orders(read_lines(path)):
+        settlement.add(order)
+        if progress and settlement.orders % progress == 0:
+            revenue = Beverage.pricing.format(settlement.revenue)
+            print(f"{settlement.orders} orders, {revenue}")
+    elapsed = time.perf_counter() - start
+    return settlement, elapsed
+
+
+def settle_parallel(path, workers):
+    """Price the file in byte-range chunks across a process pool."""
+    settlement = Settlement()
+    start = time.perf_counter()
+    ranges = chunk_ranges(path, workers * 4)
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(settle_range, path, *bounds) for bounds in ranges]
+        for future in futures:
+            settlement.merge(future.result())
+    elapsed = time.perf_counter() - start
+    return settlement, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="order log, one order per line")
+    parser.add_argument(
+        "--progress", type=int, default=0, help="print totals every N orders"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="settle chunks in N processes"
+    )
+    parser.add_argument(
+        "--cents", action="store_true", help="total in exact integer cents"
+    )
+    parser.add_argument("--menu", help="JSON or TOML menu to price with")
+    args = parser.parse_args(argv)
+    if args.menu:
+        set_pricing(load_menu(args.menu, exact=args.cents))
+    elif args.cents:
+        set_pricing(CENTS_PRICING)
+    try:
+        if args.workers > 1:
+            settlement, elapsed = settle_parallel(args.path, args.workers)
+        else:
+            settlement, elapsed = settle(args.path, args.progress)
+    except OrderError as error:
+        parser.exit(1, f"{parser.prog}: {args.path}: {error}\n")
+    settlement.report()
+    rate = settlement.orders / elapsed if elapsed else 0.0
+    print(f"{rate:,.0f} orders/s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Percentage-off promotions matched through an index.
+
+A promotion names an optional base beverage, an optional size and a set of
+condiments the drink must include, e.g. 10% off any VENTI with Mocha + Whip.
+Rules are indexed by (base, size, condiment set), so finding the ones that
+apply to a drink costs a handful of dict lookups however many rules exist.
+"""
+import collections
+import itertools
+
+import numpy as np
+
+from starbuzz_batch import current_tables, price_batch
+from starbuzz_cache import signature
+from starbuzz_with_sizes import (
+    BEVERAGES,
+    CONDIMENTS,
+    SIZE_CONVERTER,
+    Beverage,
+    CentsPricing,
+    Size,
+)
+
+SIZES = sorted(Size, key=SIZE_CONVERTER.get)
+
+
+class Promotion:
+    """`percent` off drinks matching every criterion given."""
+
+    def __init__(self, name, percent, base=None, size=None, condiments=()) -> None:
+        self.name = name
+        self.percent = percent
+        self.base = base
+        self.size = size
+        self.condiments = frozenset(condiments)
+
+    def __repr__(self) -> str:
+        return f"Promotion({self.name!r}, {self.percent}%)"
+
+    def matches(self, drink):
+        """Check the rule directly, without an index."""
+        base, size, counts = signature(drink)
+        present = {c for c, count in zip(CONDIMENTS, counts) if count}
+        return (
+            self.base in (None, base)
+            and self.size in (None, size)
+            and self.condiments <= present
+        )
+
+
+def percent_of(cents, percent):
+    """`percent` of whole `cents`, half a cent rounding up; works on arrays too."""
+    return (cents * percent + 50) // 100
+
+
+def discount(price, percent, pricing=None):
+    """The amount `percent` takes off `price`, in the backend's units.
+
+    Float prices are discounted in whole cents as well, so a drink gets the
+    same discount from price() and from price_batch().
+    """
+    pricing = pricing or Beverage.pricing
+    if isinstance(pricing, CentsPricing):
+        return percent_of(price, percent)
+    return percent_of(round(price * 100), percent) / 100
+
+
+class PromotionIndex:
+    """Promotions keyed by (base, size, condiment set), None meaning any."""
+
+    def __init__(self, promotions=()) -> None:
+        self._rules = collections.defaultdict(list)
+        # The best rule of each key, so best() is independent of rule count.
+        self._best = {}
+        self._count = 0
+        for promotion in promotions:
+            self.add(promotion)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, promotion: Promotion):
+        key = (promotion.base, promotion.size, promotion.condiments)
+        self._rules[key].append((self._count, promotion))
+        best = self._best.get(key)
+        if best is None or promotion.percent > best[1].percent:
+            self._best[key] = (self._count, promotion)
+        self._count += 1
+
+    def _keys(self, base, size, present):
+        present = sorted(present, key=CONDIMENTS.index)
+        for length in range(len(present) + 1):
+            for condiments in itertools.combinations(present, length):
+                condiments = frozenset(condiments)
+                for any_base in (base, None):
+                    for any_size in (size, None):
+                        yield any_base, any_size, condiments
+
+    def _candidates(self, base, size, present):
+        for key in self._keys(base, size, present):
+            yield from self._rules.get(key, ())
+
+    def _best_candidates(self, base, size, present):
+        for key in self._keys(base, size, present):
+            best = self._best.get(key)
+            if best is not None:
+                yield best
+
+    def applicable(self, drink):
+        """Every promotion that applies, in the order they were added."""
+        base, size, counts = signature(drink)
+        present = [c for c, count in zip(CONDIMENTS, counts) if count]
+        return [rule for _, rule in sorted(self._candidates(base, size, present))]
+
+    def best(self, drink):
+        """The biggest applicable promotion, earliest added on ties."""
+        base, size, counts = signature(drink)
+        present = [c for c, count in zip(CONDIMENTS, counts) if count]
+        best = max(
+            self._best_candidates(base, size, present),
+            key=lambda rule: (rule[1].percent, -rule[0]),
+            default=None,
+        )
+        return best and best[1]
+
+    def price(self, drink):
+        """Return (cost after discount, discount, promotion or None)."""
+        pricing = Beverage.pricing
+        cost = drink.cost()
+        promotion = self.best(drink)
+        off = discount(cost, 0 if promotion is None else promotion.percent, pricing)
+        return pricing.total((cost, -off)), off, promotion
+
+    def best_percents(self, bases, sizes, counts):
+        """Best percent off for every order in batch columns.
+
+        Each distinct (base, size, condiments present) combination is looked
+        up once.
+        """
+        bases = np.asarray(bases, dtype=np.int64)
+        sizes = np.asarray(sizes, dtype=np.int64)
+        present = (np.asarray(counts) > 0) @ (1 << np.arange(len(CONDIMENTS)))
+        codes = (bases * len(SIZES) + sizes) << len(CONDIMENTS) | present
+        unique, inverse = np.unique(codes, return_inverse=True)
+        percents = np.zeros(len(unique), dtype=np.int64)
+        for index, code in enumerate(unique.tolist()):
+            mask = code & ((1 << len(CONDIMENTS)) - 1)
+            base, size = divmod(code >> len(CONDIMENTS), len(SIZES))
+            condiments = [c for bit, c in enumerate(CONDIMENTS) if mask >> bit & 1]
+            rules = self._best_candidates(BEVERAGES[base], SIZES[size], condiments)
+            percents[index] = max((rule.percent for _, rule in rules), default=0)
+        return percents[inverse.reshape(-1)]
+
+    def price_batch(self, bases, sizes, counts, tables=None):
+        """Price batch columns and apply each order's best promotion.
+
+        Returns (prices after discount, discounts).
+        """
+        tables = tables or current_tables()
+        prices = price_batch(bases, sizes, counts, tables)
+        percents = self.best_percents(bases, sizes, counts)
+        if tables.exact:
+            discounts = percent_of(prices, percents)
+            return prices - discounts, discounts
+        # Work in whole cents, as discount() does, and convert back once.
+        cents = np.rint(prices * 100).astype(np.int64)
+        discounts = percent_of(cents, percents)
+        return (cents - discounts) / 100, discounts / 100
+
+
+if __name__ == "__main__":
+    from starbuzz_batch import encode_beverages
+    from starbuzz_with_sizes import DarkRoast, HouseBlend, Milk, Mocha, Whip
+
+    promotions = PromotionIndex(
+        [
+            Promotion(
+                "venti mocha whip", 10, size=Size.venti, condiments=[Mocha, Whip]
+            ),
+            Promotion("dark roast day", 20, base=DarkRoast),
+        ]
+    )
+    drinks = [
+        Whip(Mocha(HouseBlend(Size.venti))),
+        Milk(DarkRoast(Size.tall)),
+        Milk(HouseBlend(Size.tall)),
+    ]
+    for drink in drinks:
+        # 2.84 - 0.28, 1.00 - 0.20, no promotion
+        print(drink.get_description(), promotions.price(drink))
+    print(promotions.price_batch(*encode_beverages(drinks)))
@@ -0,0 +1,201 @@
+"""Asyncio point-of-sale pricing server.
+
+Clients send order lines such as ``VENTI HouseBlend Mocha Whip`` and get back
+``<price> <description>`` per line, or ``ERROR <reason>``. Sending ``STATS``
+returns the server's batching, cache and latency figures.
+
+Requests from every connection are coalesced into micro-batches: identical
+lines in a batch are priced once, and drinks come from a shared DrinkCache.
+"""
+import argparse
+import asyncio
+import collections
+import random
+import time
+
+from starbuzz_cache import DrinkCache
+from starbuzz_orders import parse_order
+from starbuzz_with_sizes import BEVERAGES, CONDIMENTS, Beverage, Size
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of an unsorted sequence."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class PricingServer:
+    """Prices order lines in micro-batches of up to `max_batch` requests.
+
+    A batch closes once it is full or `max_delay` seconds after its first
+    request arrived, whichever comes first.
+    """
+
+    def __init__(self, max_batch=256, max_delay=0.001, cache_size=4096) -> None:
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.cache = DrinkCache(cache_size)
+        self.batches = 0
+        self.requests = 0
+        self.latencies = collections.deque(maxlen=100_000)
+        self._queue = None
+        self._batcher = None
+        self._server = None
+        self._connections = {}
+
+    async def start(self, host="127.0.0.1", port=0):
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._run_batches())
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        self._server.close()
+        for writer in self._connections:
+            writer.close()
+        await asyncio.gather(*self._connections.values(), return_exceptions=True)
+        await self._server.wait_closed()
+        self._batcher.cancel()
+
+    async def price(self, line: str) -> str:
+        """Queue one order line and wait for its batch to price it."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((line, future, time.perf_counter()))
+        return await future
+
+    def price_line(self, line: str) -> str:
+        try:
+            drink = self.cache.lookup(parse_order(line.encode("ascii")))
+        except (KeyError, ValueError, UnicodeEncodeError):
+            return f"ERROR bad order {line!r}"
+        cost = Beverage.pricing.format(drink.cost())
+        return f"{cost} {drink.get_description()}"
+
+    def stats(self) -> str:
+        latencies = list(self.latencies)
+        batch_size = self.requests / self.batches if self.batches else 0.0
+        return (
+            f"requests={self.requests} batches={self.batches} "
+            f"avg_batch={batch_size:.1f} hit_rate={self.cache.hit_rate():.2f} "
+            f"p50_ms={percentile(latencies, 0.50) * 1000:.3f} "
+            f"p99_ms={percentile(latencies, 0.99) * 1000:.3f}"
+        )
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self._price_batch(batch)
+
+    def _price_batch(self, batch):
+        replies = {}
+        now = time.perf_counter()
+        for line, future, queued in batch:
+            if line not in replies:
+                replies[line] = self.price_line(line)
+            if not future.done():
+                future.set_result(replies[line])
+            self.latencies.append(now - queued)
+        self.batches += 1
+        self.requests += len(batch)
+
+    async def _handle(self, reader, writer):
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while line := await reader.readline():
+                line = line.decode("ascii", "replace").strip()
+                if not line:
+                    continue
+                reply = self.stats() if line == "STATS" else await self.price(line)
+                writer.write(reply.encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+
+def random_order_lines(count, seed=0):
+    """A repeatable mix of order lines for load testing."""
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        condiments = rng.choices(CONDIMENTS, k=rng.randint(0, 3))
+        words = [rng.choice(list(Size)).value, rng.choice(BEVERAGES).__name__]
+        lines.append(" ".join(words + [c.__name__ for c in condiments]))
+    return lines
+
+
+async def load_test(host, port, connections=50, requests=200, seed=0):
+    """Drive the server from many connections; return client-side figures."""
+    lines = random_order_lines(1000, seed)
+    latencies = []
+
+    async def client(index):
+        reader, writer = await asyncio.open_connection(host, port)
+        for request in range(requests):
+            line = lines[(index * requests + request) % len(lines)]
+            start = time.perf_counter()
+            writer.write(line.encode() + b"\n")
+            await writer.drain()
+            await reader.readline()
+            latencies.append(time.perf_counter() - start)
+        writer.close()
+        await writer.wait_closed()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(index) for index in range(connections)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "requests_per_s": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def serve(host, port):
+    server = PricingServer()
+    host, port = await server.start(host, port)
+    print(f"Pricing orders on {host}:{port}")
+    await asyncio.Event().wait()
+
+
+async def bench(connections, requests):
+    server = PricingServer()
+    host, port = await server.start()
+    result = await load_test(host, port, connections, requests)
+    print(
+        f"{result['requests']} requests, {result['requests_per_s']:,.0f}/s, "
+        f"p50 {result['p50_ms']:.2f}ms, p99 {result['p99_ms']:.2f}ms"
+    )
+    print(server.stats())
+    await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="run the pricing server")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8642)
+    bench_parser = commands.add_parser("bench", help="load test an in-process server")
+    bench_parser.add_argument("--connections", type=int, default=50)
+    bench_parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    if args.command == "serve":
+        asyncio.run(serve(args.host, args.port))
+    else:
+        asyncio.run(bench(args.connections, args.requests))
@@ -1,10 +1,18 @@
 """Decorator pattern: Starbuzz coffee example."""
+from starbuzz import CENTS_PRICING, FLOAT_PRICING, memoized
 
 
 class Beverage:
+    __slots__ = ()
+    description = None
+    price = 0
+    pricing = FLOAT_PRICING
+    # Bumped whenever a decorator chain or the pricing changes so memoized
+    # results go stale.
+    _generation = 0
 
-    def __init__(self) -> None:
-        self.description = None
+    def _stamp(self):
+        return Beverage._generation
 
     def get_description(self):
         return self.description
@@ -14,97 +22,110 @@ class Beverage:
 
 
 class HouseBlend(Beverage):
-
-    def __init__(self) -> None:
-        super().__init__()
-        self.description = "House blend coffee"
+    __slots__ = ()
+    description = "House blend coffee"
+    price = 1.10
 
     def cost(self):
-        return 1.10
+        return self.pricing.price(HouseBlend)
 
 
 class DarkRoast(Beverage):
-
-    def __init__(self) -> None:
-        super().__init__()
-        self.description = "Dark Roast coffee"
+    __slots__ = ()
+    description = "Dark Roast coffee"
+    price = 0.75
 
     def cost(self):
-        return 0.75
+        return self.pricing.price(DarkRoast)
 
 
 class Espresso(Beverage):
-
-    def __init__(self) -> None:
-        super().__init__()
-        self.description = "Espresso coffee"
+    __slots__ = ()
+    description = "Espresso coffee"
+    price = 2.10
 
     def cost(self):
-        return 2.10
+        return self.pricing.price(Espresso)
 
 
 class Decaf(Beverage):
-
-    def __init__(self) -> None:
-        super().__init__()
-        self.description = "Decaf coffee"
+    __slots__ = ()
+    description = "Decaf coffee"
+    price = 1.25
 
     def cost(self):
-        return 1.25
+        return self.pricing.price(Decaf)
 
 
 class CondimentDecorator(Beverage):
+    __slots__ = ("_beverage", "_memo_cost", "_memo_get_description")
+    description = ""
 
     def __init__(self, beverage) -> None:
-        self.beverage = beverage
-        self.description = ""
+        self._beverage = beverage
+        self._memo_cost = self._memo_get_description = None
+
+    @property
+    def beverage(self):
+        return self._beverage
 
+    @beverage.setter
+    def beverage(self, beverage):
+        self._beverage = beverage
+        Beverage._generation += 1
+
+    @memoized
     def get_description(self):
-        self.beverage.description += f" + {self.description}"
-        return self.beverage.get_description()
+        return f"{self.beverage.get_description()} + {self.description}"
 
     def cost(self):
         raise NotImplementedError("Implement this for each...")
 
 
 class Milk(CondimentDecorator):
+    __slots__ = ()
+    description = "milk"
+    price = 0.25
 
-    def __init__(self, beverage) -> None:
-        super().__init__(beverage)
-        self.description = "milk"
-
+    @memoized
     def cost(self):
-        return self.beverage.cost() + 0.25
+        return self.pricing.add(self.beverage.cost(), Milk)
 
 
 class Mocha(CondimentDecorator):
+    __slots__ = ()
+    description = "mocha"
+    price = 0.99
 
-    def __init__(self, beverage) -> None:
-        super().__init__(beverage)
-        self.description = "mocha"
-
+    @memoized
     def cost(self):
-        return self.beverage.cost() + 0.99
+        return self.pricing.add(self.beverage.cost(), Mocha)
 
 
 class Soy(CondimentDecorator):
+    __slots__ = ()
+    description = "soy"
+    price = 0.45
 
-    def __init__(self, beverage) -> None:
-        super().__init__(beverage)
-        self.description = "soy"
-
+    @memoized
     def cost(self):
-        return self.beverage.cost() + 0.45
+        return self.pricing.add(self.beverage.cost(), Soy)
 
 
 class Whip(CondimentDecorator):
+    __slots__ = ()
+    description = "whip"
+    price = 0.15
 
-    def __init__(self, beverage) -> None:
-        super().__init__(beverage)
-        self.description = "whip"
-
+    @memoized
     def cost(self):
-        return self.beverage.cost() + 0.15
+        return self.pricing.add(self.beverage.cost(), Whip)
+
+
+def set_pricing(pricing):
+    """Switch every drink to another pricing backend."""
+    Beverage.pricing = pricing
+    Beverage._generation += 1
 
 
 if __name__ == "__main__":
@@ -127,3 +148,8 @@ if __name__ == "__main__":
     # = 2.10 + 0.15 * 3 = 2.55
     print(drink4.cost())
     print(drink4.get_description())
+
+    set_pricing(CENTS_PRICING)
+    # = 255 cents, formatted only for display
+    print(drink4.cost())
+    print(CENTS_PRICING.format(drink4.cost()))
@@ -1,6 +1,8 @@
 """Decorator pattern: Starbuzz coffee example."""
 import enum
 
+from starbuzz import memoized
+
 
 class Size(str, enum.Enum):
     tall = "TALL"
@@ -15,118 +17,283 @@ SIZE_CONVERTER = {
 }
 
 
+class FloatPricing:
+    """Price drinks in float dollars, straight from the menu literals."""
+
+    def components(self, item):
+        return item.price, item.size_step
+
+    def price(self, item, size: Size):
+        return self.add(0, item, size)
+
+    def add(self, amount, item, size: Size):
+        price, size_step = self.components(item)
+        return amount + price + size_step * SIZE_CONVERTER[size]
+
+    def total(self, amounts):
+        return round(sum(amounts), 2)
+
+    def format(self, amount):
+        return f"{amount:.2f}"
+
+
+class CentsPricing:
+    """Price drinks in exact integer cents.
+
+    Each item's price and size step are converted to cents once and cached,
+    so totals never pick up float rounding however many are summed.
+    """
+
+    def __init__(self) -> None:
+        self._cents = {}
+
+    def components(self, item):
+        cents = self._cents.get(item)
+        if cents is None:
+            cents = (round(item.price * 100), round(item.size_step * 100))
+            self._cents[item] = cents
+        return cents
+
+    def price(self, item, size: Size):
+        price, size_step = self.components(item)
+        return price + size_step * SIZE_CONVERTER[size]
+
+    def add(self, amount, item, size: Size):
+        return amount + self.price(item, size)
+
+    def total(self, amounts):
+        return sum(amounts)
+
+    def format(self, amount):
+        return f"{amount // 100}.{amount % 100:02d}"
+
+
+FLOAT_PRICING = FloatPricing()
+CENTS_PRICING = CentsPricing()
+
+
 class Beverage:
+    """A drink on the menu, priced at its size.
+
+    A decorated drink is priced at its own, outermost size throughout: the
+    sizes its inner layers were built or resized with don't change its cost.
+    That is the size get_size() reports and compile_beverage() records.
+
+    Memoized results are stamped with the pricing generation and a resize
+    counter. The counter is kept per chain, on the base drink that the
+    decorators were built around, so resizing one drink only invalidates the
+    drinks that contain it.
+    """
+
+    __slots__ = ("size", "_root", "_resized")
+    description = None
+    price = 0
+    size_step = 0
+    pricing = FLOAT_PRICING
+    # Bumped whenever the pricing changes so every memoized result goes stale.
+    _generation = 0
 
     def __init__(self, size: Size) -> None:
         self.size = size
-        self.description = None
+        self._root = self
+        self._resized = 0
+
+    def _chain(self):
+        """Return the base drink that counts resizes for this drink's chain."""
+        root = self._root
+        while root._root is not root:
+            root = root._root
+        return root
+
+    def _stamp(self):
+        return Beverage._generation, self._chain()._resized
 
     def get_description(self):
         return self.description
 
     def set_size(self, size: Size):
         self.size = size
+        self._chain()._resized += 1
 
     def get_size(self):
         return self.size
 
     def cost(self):
-        raise NotImplementedError("Implement this...")
+        return self.cost_with(self.pricing)
 
+    def cost_with(self, pricing):
+        """Price the drink with a single pricing backend throughout."""
+        return pricing.total((self.subtotal_with(pricing, self.size),))
 
-class HouseBlend(Beverage):
+    def subtotal_with(self, pricing, size: Size):
+        """Add up the chain's prices at `size` from the inside out, unrounded."""
+        return pricing.price(type(self), size)
 
-    def __init__(self, size: Size) -> None:
-        super().__init__(size)
-        self.description = "House blend coffee"
 
-    def cost(self):
-        return 1.10 + 0.10 * SIZE_CONVERTER[self.size]
+class HouseBlend(Beverage):
+    __slots__ = ()
+    description = "House blend coffee"
+    price = 1.10
+    size_step = 0.10
 
 
 class DarkRoast(Beverage):
-
-    def __init__(self, size: Size) -> None:
-        super().__init__(size)
-        self.description = "Dark Roast coffee"
-
-    def cost(self):
-        return 0.75 + 0.05 * SIZE_CONVERTER[self.size]
+    __slots__ = ()
+    description = "Dark Roast coffee"
+    price = 0.75
+    size_step = 0.05
 
 
 class Espresso(Beverage):
-
-    def __init__(self, size: Size) -> None:
-        super().__init__(size)
-        self.description = "Espresso coffee"
-
-    def cost(self):
-        return 2.10 + 0.20 * SIZE_CONVERTER[self.size]
+    __slots__ = ()
+    description = "Espresso coffee"
+    price = 2.10
+    size_step = 0.20
 
 
 class Decaf(Beverage):
-
-    def __init__(self, size: Size) -> None:
-        super().__init__(size)
-        self.description = "Decaf coffee"
-
-    def cost(self):
-        return 1.25 + 0.15 * SIZE_CONVERTER[self.size]
+    __slots__ = ()
+    description = "Decaf coffee"
+    price = 1.25
+    size_step = 0.15
 
 
 class CondimentDecorator(Beverage):
+    __slots__ = ("_beverage", "_memo_cost", "_memo_get_description")
+    description = ""
 
     def __init__(self, beverage) -> None:
-        self.beverage = beverage
-        self.size = self.beverage.size
-        self.description = ""
-
+        self._beverage = beverage
+        self._memo_cost = self._memo_get_description = None
+        self.size = beverage.size
+        self._root = beverage._chain()
+
+    @property
+    def beverage(self):
+        return self._beverage
+
+    @beverage.setter
+    def beverage(self, beverage):
+        self._beverage = beverage
+        # Drinks built on this one now depend on the new chain too, so the
+        # two chains share one counter from here on.
+        root = beverage._chain()
+        self._chain()._root = root
+        root._resized += 1
+
+    @memoized
     def get_description(self):
-        self.beverage.description += f" + {self.description}"
-        return self.beverage.get_description()
+        return f"{self.beverage.get_description()} + {self.description}"
 
+    @memoized
     def cost(self):
-        raise NotImplementedError("Implement this for each...")
+        return self.cost_with(self.pricing)
+
+    def subtotal_with(self, pricing, size: Size):
+        return pricing.add(self.beverage.subtotal_with(pricing, size), type(self), size)
 
 
 class Milk(CondimentDecorator):
+    __slots__ = ()
+    description = "milk"
+    price = 0.25
+    size_step = 0.05
 
-    def __init__(self, beverage) -> None:
-        super().__init__(beverage)
-        self.description = "milk"
 
-    def cost(self):
-        return self.beverage.cost() + 0.25 + 0.05 * SIZE_CONVERTER[self.size]
+class Mocha(CondimentDecorator):
+    __slots__ = ()
+    description = "mocha"
+    price = 0.99
+    size_step = 0.15
 
 
-class Mocha(CondimentDecorator):
+class Soy(CondimentDecorator):
+    __slots__ = ()
+    description = "soy"
+    price = 0.45
+    size_step = 0.10
 
-    def __init__(self, beverage) -> None:
-        super().__init__(beverage)
-        self.description = "mocha"
 
-    def cost(self):
-        return self.beverage.cost() + 0.99 + 0.15 * SIZE_CONVERTER[self.size]
+class Whip(CondimentDecorator):
+    __slots__ = ()
+    description = "whip"
+    price = 0.15
+    size_step = 0.05
 
 
-class Soy(CondimentDecorator):
+def set_pricing(pricing):
+    """Switch every drink, compiled or not, to another pricing backend.
 
-    def __init__(self, beverage) -> None:
-        super().__init__(beverage)
-        self.description = "soy"
+    Rebinding Beverage.pricing is atomic: a drink being priced either sees the
+    old backend or the new one, never a mix.
+    """
+    Beverage.pricing = pricing
+    Beverage._generation += 1
 
-    def cost(self):
-        return self.beverage.cost() + 0.45 + 0.10 * SIZE_CONVERTER[self.size]
 
+BEVERAGES = (HouseBlend, DarkRoast, Espresso, Decaf)
+CONDIMENTS = (Milk, Mocha, Soy, Whip)
+CONDIMENT_INDEX = {condiment: index for index, condiment in enumerate(CONDIMENTS)}
 
-class Whip(CondimentDecorator):
 
-    def __init__(self, beverage) -> None:
-        super().__init__(beverage)
-        self.description = "whip"
+class CompiledBeverage:
+    """A decorated beverage flattened into its base, size and condiment counts.
+
+    `counts` lines up with CONDIMENTS. `runs` keeps the (condiment, count)
+    runs from the innermost decorator out, so the description reads the same
+    as the decorator chain it was compiled from.
+    """
+
+    __slots__ = ("base", "size", "counts", "runs")
+
+    def __init__(self, base, size: Size, counts, runs) -> None:
+        self.base = base
+        self.size = size
+        self.counts = counts
+        self.runs = runs
+
+    def get_description(self):
+        parts = [self.base.description]
+        for condiment, count in self.runs:
+            parts.extend([condiment.description] * count)
+        return " + ".join(parts)
+
+    def set_size(self, size: Size):
+        self.size = size
+
+    def get_size(self):
+        return self.size
+
+    def itemized(self, pricing=None):
+        """Return (menu item, amount) pairs for the base and each condiment."""
+        pricing = pricing or Beverage.pricing
+        items = [(self.base, pricing.price(self.base, self.size))]
+        for condiment, count in zip(CONDIMENTS, self.counts):
+            if count:
+                items.append((condiment, pricing.price(condiment, self.size) * count))
+        return items
 
     def cost(self):
-        return self.beverage.cost() + 0.15 + 0.05 * SIZE_CONVERTER[self.size]
+        pricing = Beverage.pricing
+        return pricing.total(amount for _, amount in self.itemized(pricing))
+
+
+def compile_beverage(beverage):
+    """Flatten a CondimentDecorator chain without recursing through it."""
+    size = beverage.get_size()
+    layers = []
+    while isinstance(beverage, CondimentDecorator):
+        layers.append(type(beverage))
+        beverage = beverage.beverage
+    counts = [0] * len(CONDIMENTS)
+    runs = []
+    for condiment in reversed(layers):
+        counts[CONDIMENT_INDEX[condiment]] += 1
+        if runs and runs[-1][0] is condiment:
+            runs[-1] = (condiment, runs[-1][1] + 1)
+        else:
+            runs.append((condiment, 1))
+    return CompiledBeverage(type(beverage), size, tuple(counts), tuple(runs))
 
 
 if __name__ == "__main__":
@@ -149,3 +316,14 @@ if __name__ == "__main__":
     # = 2.30 + 0.20 * 3 = 2.90
     print(drink4.cost())
     print(drink4.get_description())
+
+    drink5 = Espresso(Size.venti)
+    for _ in range(5000):
+        drink5 = Whip(drink5)
+    # = 2.50 + 0.25 * 5000 = 1252.50, too deep for the decorator chain itself
+    print(compile_beverage(drink5).cost())
+
+    set_pricing(CENTS_PRICING)
+    # = 290 cents, formatted only for display
+    print(drink4.cost())
+    print(CENTS_PRICING.format(drink4.cost()))